@@ -0,0 +1,6 @@
+"""
+KandyScript benchmarks.
+
+Run the suite with 'python -m benchmarks' (see benchmarks/runner.py); generator_memory.py and
+string_render.py are standalone measurements.
+"""
@@ -0,0 +1,81 @@
+""" Memory benchmark: iterate a generated sequence vs. a list built in memory. """
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import Interpreter  # noqa: E402
+
+GENERATOR_SCRIPT = """
+def sequence(int n){
+    int i = 0
+    while i < n {
+        yield i
+        i += 1
+    }
+}
+
+int total = 0
+for value in sequence(COUNT) {
+    total += value
+}
+return total
+"""
+
+LIST_SCRIPT = """
+def sequence(int n){
+    list values = []
+    int i = 0
+    while i < n {
+        values.append(i)
+        i += 1
+    }
+    return values
+}
+
+int total = 0
+for value in sequence(COUNT) {
+    total += value
+}
+return total
+"""
+
+
+def measure(script, count):
+    """ Return (result, seconds, peak_bytes) of a script run. """
+    interpreter = Interpreter()
+    tree = interpreter._generate_ast(script)
+    interpreter.reset(start_variables={"COUNT": count})
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = interpreter._visit_ast(tree)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, seconds, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=10_000_000, help="elements of the sequence")
+    parser.add_argument("--skip-list", action="store_true", help="only measure the generator version")
+    args = parser.parse_args(argv)
+
+    modes = [("generator", GENERATOR_SCRIPT)]
+    if not args.skip_list:
+        modes.append(("list", LIST_SCRIPT))
+
+    expected = args.count * (args.count - 1) // 2
+    for name, script in modes:
+        result, seconds, peak = measure(script, args.count)
+        status = "ok" if result == expected else f"WRONG RESULT {result!r}"
+        print(f"{name:<10} count={args.count:<10} time={seconds:8.2f}s  peak={peak / 1024:10.1f} KiB  {status}")
+
+
+if __name__ == "__main__":
+    main()
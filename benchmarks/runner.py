@@ -0,0 +1,92 @@
+""" Benchmark runner: python -m benchmarks [--filter NAME] [--json results.json] [--compare old.json] """
+import argparse
+import json
+import math
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.workloads import WORKLOADS
+
+
+def measure(setup, scale=1, repeat=10, warmup=2):
+    """ Return the timing stats (seconds) of a workload. """
+    run = setup(scale)
+    for _ in range(warmup):
+        run()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    times.sort()
+    return {
+        "median": statistics.median(times),
+        "p95": times[max(0, math.ceil(len(times) * 0.95) - 1)],
+        "min": times[0],
+        "mean": statistics.fmean(times),
+        "repeat": repeat,
+    }
+
+
+def git_revision():
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return output.stdout.strip()
+
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="KandyScript benchmark suite.")
+    parser.add_argument("--filter", action="append", default=[], help="run the workloads containing this text")
+    parser.add_argument("--repeat", type=int, default=10, help="timed runs of each workload")
+    parser.add_argument("--warmup", type=int, default=2, help="untimed runs before timing")
+    parser.add_argument("--scale", type=int, default=1, help="multiplier of the workload sizes")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="results (--json) of a previous run to compare the medians with")
+    parser.add_argument("--list", action="store_true", help="list the workloads and exit")
+    args = parser.parse_args(argv)
+
+    names = [name for name in WORKLOADS if not args.filter or any(text in name for text in args.filter)]
+    if args.list:
+        print("\n".join(names))
+        return
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+    print(f"{'workload':<24} {'median (ms)':>12} {'p95 (ms)':>10} {'min (ms)':>10}" + ("  vs. baseline" if baseline else ""))
+
+    results = {}
+    for name in names:
+        stats = results[name] = measure(WORKLOADS[name], args.scale, args.repeat, args.warmup)
+        line = f"{name:<24} {stats['median'] * 1e3:12.2f} {stats['p95'] * 1e3:10.2f} {stats['min'] * 1e3:10.2f}"
+        if name in baseline:
+            line += f"  {baseline[name]['median'] / stats['median']:6.2f}x"
+
+        print(line)
+
+    if args.json:
+        output = {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scale": args.scale,
+            "warmup": args.warmup,
+            "results": results,
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
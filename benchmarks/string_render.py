@@ -0,0 +1,51 @@
+""" Render benchmark: evaluate a string with 10 interpolated expressions. """
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import Interpreter  # noqa: E402
+
+SETUP_SCRIPT = """
+str name = "worker"
+int step = 7
+float ratio = 0.4567
+list items = [1, 2, 3]
+"""
+
+STRING_LITERAL = (
+    '"[$name] step={step:>5} {step * 2:04d} {ratio:.2f} {ratio=} '
+    '{name!r} {name.upper():^10} {items} {len(items)} {step + 1}"'
+)
+
+
+def measure(count):
+    """ Return (result, seconds) of rendering the string `count` times. """
+    interpreter = Interpreter()
+    interpreter.interpret(SETUP_SCRIPT)
+    node = interpreter.parser.parse_expr(STRING_LITERAL)
+
+    visit = interpreter.visit
+    result = None
+    start = time.perf_counter()
+    for _ in range(count):
+        result = visit(node)
+    seconds = time.perf_counter() - start
+
+    return result, seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=1_000_000, help="renders of the string")
+    args = parser.parse_args(argv)
+
+    result, seconds = measure(args.count)
+    print(f"render     count={args.count:<10} time={seconds:8.2f}s  per-render={seconds / args.count * 1e6:8.2f}us")
+    print(f"result     {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+""" Workloads of the benchmark suite: each one prepares its data and returns the function to time. """
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import Interpreter  # noqa: E402
+from kandylib.lexer import Lexer  # noqa: E402
+from kandylib.parser import Parser  # noqa: E402
+from kandylib.tokentype import TokenType  # noqa: E402
+from kandylib.actions import module_registry  # noqa: E402
+from benchmarks.string_render import SETUP_SCRIPT, STRING_LITERAL  # noqa: E402
+from benchmarks.generator_memory import GENERATOR_SCRIPT  # noqa: E402
+
+WORKLOADS = {}  # name: setup(scale) -> run()
+
+
+def workload(name):
+    """ Register a workload: a setup function of the scale that returns the function to time. """
+    def register(setup):
+        WORKLOADS[name] = setup
+        return setup
+
+    return register
+
+
+def _script(text, start_variables=None):
+    """ Return a function that interprets a parsed script with a fresh global state. """
+    interpreter = Interpreter()
+    tree = interpreter._generate_ast(text)
+
+    def run():
+        interpreter.reset(start_variables=start_variables)
+        return interpreter._visit_ast(tree)
+
+    return run
+
+
+@workload("lex_large_source")
+def lex_large_source(scale):
+    line = 'int value_{0} = {0} * 2 + compute("item $name {{value_{0}}}", 3.5) # comment {0}\n'
+    text = "".join(line.format(i) for i in range(2000 * scale))
+
+    def run():
+        lexer = Lexer()
+        lexer.load(text)
+        while lexer.get_next_token().type != TokenType.EOF:
+            pass
+
+    return run
+
+
+@workload("parse_deep_expression")
+def parse_deep_expression(scale):
+    nested = "(" * 30 + "x" + " + 1) * 2" * 30
+    flat = " + ".join(f"a{i} * {i} - b{i} / 2" for i in range(150))
+    expressions = [nested, flat] * scale
+
+    def run():
+        parser = Parser()
+        for expression in expressions:
+            parser.parse_expr(expression)
+
+    return run
+
+
+@workload("arithmetic_loop")
+def arithmetic_loop(scale):
+    return _script("""
+        int total = 0
+        int i = 0
+        while i < COUNT {
+            total += (i * 3 + 7) % 11 - i // 5
+            i += 1
+        }
+        return total
+    """, {"COUNT": 20000 * scale})
+
+
+@workload("function_calls")
+def function_calls(scale):
+    return _script("""
+        def int fib(int n) {
+            if n < 2 { return n }
+            return fib(n - 1) + fib(n - 2)
+        }
+        def int add(int a, int b) => a + b
+
+        int total = 0
+        int i = 0
+        while i < COUNT {
+            total = add(total, i)
+            i += 1
+        }
+        return fib(15) + total
+    """, {"COUNT": 3000 * scale})
+
+
+@workload("string_interpolation")
+def string_interpolation(scale):
+    interpreter = Interpreter()
+    interpreter.interpret(SETUP_SCRIPT)
+    node = interpreter.parser.parse_expr(STRING_LITERAL)
+    visit = interpreter.visit
+    count = 5000 * scale
+
+    def run():
+        for _ in range(count):
+            visit(node)
+
+    return run
+
+
+@workload("class_method_dispatch")
+def class_method_dispatch(scale):
+    return _script("""
+        class Counter(){
+            proc __init__(Counter self, int start){
+                self.value = start
+            }
+
+            def int get() => self.value
+
+            proc add(int amount){
+                self.value = self.value + amount
+            }
+        }
+
+        Counter counter = Counter(0)
+        int i = 0
+        while i < COUNT {
+            counter.add(counter.get() % 7)
+            i += 1
+        }
+        return counter.get()
+    """, {"COUNT": 3000 * scale})
+
+
+@workload("generator_iteration")
+def generator_iteration(scale):
+    return _script(GENERATOR_SCRIPT, {"COUNT": 5000 * scale})
+
+
+@workload("switch_dispatch")
+def switch_dispatch(scale):
+    switch_cases = "\n".join(f"            case {k}: total += {k}" for k in range(300))
+    when_cases = " ".join(f'case "{k}": {k}' for k in range(300))
+    return _script(f"""
+        int total = 0
+        int i = 0
+        str key = ""
+        while i < COUNT {{
+            switch i % 300 {{
+{switch_cases}
+            }}
+            key = str(i % 300)
+            total += when key {{ {when_cases} default: 0 }}
+            i += 1
+        }}
+        return total
+    """, {"COUNT": 1000 * scale})
+
+
+@workload("attribute_chains")
+def attribute_chains(scale):
+    return _script("""
+        def Server() {
+            host = "localhost"
+            port = 8080
+            ports = [80, 443, 8080]
+            export
+        }
+        def Config() {
+            server = Server()
+            export
+        }
+        cfg = Config()
+        int total = 0
+        int i = 0
+        while i < COUNT {
+            total += len(f"{cfg.server.host}:{cfg.server.port}/{cfg.server.host}")
+            total += cfg.server.port * cfg.server.ports[0] - cfg.server.ports[0] + cfg.server.port % 7
+            i += 1
+        }
+        return total
+    """, {"COUNT": 5000 * scale})
+
+
+@workload("string_methods")
+def string_methods(scale):
+    return _script("""
+        str text = "lorem ipsum " * 100000
+        int total = 0
+        int i = 0
+        while i < COUNT {
+            total += text.find("x") + len(text.reverse()[0])
+            i += 1
+        }
+        return total
+    """, {"COUNT": 100 * scale})
+
+
+@workload("regex_helpers")
+def regex_helpers(scale):
+    return _script("""
+        str text = "key=value; " * 5000
+        int total = 0
+        int i = 0
+        while i < COUNT {
+            total += len(text.replace_regex("[a-z]+=", "k:"))
+            total += len(text.split_regex("; ")) + text.find_regex("value")[1]
+            i += 1
+        }
+        return total
+    """, {"COUNT": 5 * scale})
+
+
+@workload("module_import")
+def module_import(scale):
+    directory = tempfile.mkdtemp(prefix="kandy_bench_")
+    atexit.register(shutil.rmtree, directory, True)
+
+    count = 10 * scale
+    body = "\n".join(f"def int f{j}(int v) => v + {j}" for j in range(20))
+    for i in range(count):
+        with open(os.path.join(directory, f"module_{i}.ks"), "w") as f:
+            f.write(f"{body}\nint id = {i}\n")
+
+    main_file = os.path.join(directory, "main.ks")
+    with open(main_file, "w") as f:
+        f.write("".join(f"import module_{i}\n" for i in range(count)))
+
+    def run():
+        module_registry.invalidate()
+        Interpreter().interpret_from_filename(main_file)
+
+    return run
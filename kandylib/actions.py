@@ -1,14 +1,65 @@
 import time
 import os
+import asyncio
+import mmap
+import threading
+import sys
+import types
+import importlib
+import importlib.util
+import weakref
+from itertools import islice
 
 from .undefined import UNDEFINED_TYPE
+from .archive import find_archive
+from .limits import check_runs
+from .hooks import share_hooks
 from .callstack import ActivationRecord, ARType, Record, RecordConstant
-from .ast import ScriptAction, Var, Param, TypeVar
+from .ast import Compound, ScriptAction, Var, Param, TypeVar
 from .tokentype import TokenType, Token
 
 
+# Control flow:
+class ControlFlow(BaseException):
+    """
+    Signal of a 'return', 'break' or 'continue' statement, raised by Interpreter.visit_ScriptAction
+    and caught by the statement that handles it (functions, loops, blocks). It is not an error:
+    the try statements of the scripts don't catch it.
+    """
+
+    @property
+    def data(self):
+        """ Value of the 'return', or the loop (label) of the 'break'/'continue'. """
+        return self.args[0] if self.args else None
+
+
+class ReturnSignal(ControlFlow):
+    pass
+
+
+class BreakSignal(ControlFlow):
+    pass
+
+
+class ContinueSignal(ControlFlow):
+    pass
+
+
+def return_expression(block):
+    """ Expression of a '=> expression' body (a block with only a 'return'), or None. """
+    if isinstance(block, Compound) and len(block.children) == 1:
+        action = block.children[0]
+        if (isinstance(action, ScriptAction) and action.token.type == TokenType.RETURN
+                and action.expression is not None):
+            return action.expression
+
+    return None
+
+
 # Actions Class
 class ProcedureCall():
+    uses_call_stack = True  # Not thread-safe: see kandydefault._parallel_map
+
     def __init__(self, interpreter, name, block, params, is_local=False):
         # Information:
         self.name = name
@@ -137,23 +188,34 @@ class ProcedureCall():
             self.__interpreter.call_stack.push(new_ar)
 
         # Prepare Real-Params and Interpret the body (block):
-        self.__prepare_params(args, kwargs)
-        self.__interpreter.visit(self.__block)
+        try:
+            self.__prepare_params(args, kwargs)
+            self.__interpreter.visit(self.__block)
 
-        # Restore AR:
-        if not self.__is_local:
-            self.__interpreter.call_stack.pop()
+        except ReturnSignal:
+            pass
+
+        finally:
+            # Restore AR:
+            if not self.__is_local:
+                self.__interpreter.call_stack.pop()
 
 
 class FunctionCall():
-    def __init__(self, interpreter, name, block, params, type_=None, strict=False, is_local=False):
+    uses_call_stack = True  # Not thread-safe: see kandydefault._parallel_map
+
+    def __init__(self, interpreter, name, block, params, type_=None, strict=False, is_local=False, is_async=False,
+                 is_generator=False):
         # Information:
         self.name = name
         self.__interpreter = interpreter
         self.__ar = interpreter.call_stack.peek()
         self.__block = block
+        self.__expression = return_expression(block)  # '=> expression' bodies are evaluated directly.
         self.__params = params
         self.__is_local = is_local
+        self.__is_async = is_async
+        self.__is_generator = is_generator
         self._inside_class = interpreter.is_inside_class()
 
         # Type
@@ -289,6 +351,54 @@ class FunctionCall():
         return self.__type
 
     def __call__(self, *args, **kwargs):
+        if self.__is_generator:
+            return self.__generate(args, kwargs)
+
+        if self.__is_async:
+            return KandyCoroutine(self.__interpreter, self.__execute, args, kwargs, self.name)
+
+        return self.__execute(*args, **kwargs)
+
+    def __generate(self, args, kwargs):
+        """ Lazy body: runs until each 'yield', with its records removed from the call-stack meanwhile. """
+        call_stack = self.__interpreter.call_stack
+        depth = len(call_stack)
+
+        # ActivationRecords:
+        if not self.__is_local:
+            current_ar = call_stack.peek()
+            new_ar = ActivationRecord(
+                name=self.name,
+                type_=ARType.PROCEDURE,
+                nesting_level=current_ar.nesting_level+1,
+                nesting_record=self.__ar
+            )
+            call_stack.push(new_ar)
+
+        body = None
+        try:
+            self.__prepare_params(args, kwargs)
+            body = self.__interpreter.generate(self.__block)
+            while True:
+                try:
+                    value = next(body)
+                except (StopIteration, ReturnSignal):
+                    return
+
+                records = call_stack.cut(depth)
+                try:
+                    yield value
+                finally:
+                    depth = len(call_stack)
+                    call_stack.extend(records)
+
+        finally:
+            if body is not None:
+                body.close()
+
+            call_stack.cut(depth)
+
+    def __execute(self, *args, **kwargs):
         # ActivationRecords:
         if not self.__is_local:
             current_ar = self.__interpreter.call_stack.peek()
@@ -301,20 +411,22 @@ class FunctionCall():
             self.__interpreter.call_stack.push(new_ar)
 
         # Prepare Real-Params and Interpret the body (block):
-        self.__prepare_params(args, kwargs)
-        result = self.__interpreter.visit(self.__block)
+        try:
+            self.__prepare_params(args, kwargs)
+            if self.__expression is not None:
+                result = self.__interpreter.visit(self.__expression)
+            else:
+                result = self.__interpreter.visit(self.__block)
 
-        # Restore AR:
-        if not self.__is_local:
-            self.__interpreter.call_stack.pop()
+        except ReturnSignal as action:
+            result = action.data
 
-        # Verify the result type data:
-        if isinstance(result, ScriptAction):
-            if result.token.type == TokenType.RETURN:
-                result = result.data
-            else:
-                return result
+        finally:
+            # Restore AR:
+            if not self.__is_local:
+                self.__interpreter.call_stack.pop()
 
+        # Verify the result type data:
         if (result is not None) and (self.__type is not None):
             rec = Record(result, self.__get_type(), self.__strict)
             result = rec.value
@@ -322,19 +434,95 @@ class FunctionCall():
         return result
 
 
+class KandyCoroutine():
+    """
+    Result of calling an 'async def' function.
+
+    Awaited from KandyScript the body runs inline; awaited from asyncio (gather, create_task, ...)
+    the body runs as a task in an executor thread holding the interpreter baton.
+    """
+
+    def __init__(self, interpreter, function, args, kwargs, name="kandy_coroutine"):
+        self.name = name
+        self.__interpreter = interpreter
+        self.__function = function
+        self.__args = args
+        self.__kwargs = kwargs
+        self.__records = list(interpreter.call_stack._records)
+        self.__awaited = False
+
+    def __repr__(self):
+        return f"<KandyCoroutine {self.name}>"
+
+    def run(self):
+        """ Execute the body of the coroutine in the current thread. """
+        if self.__awaited:
+            raise RuntimeError(f"cannot reuse already awaited coroutine {self.name!r}")
+
+        self.__awaited = True
+        return self.__function(*self.__args, **self.__kwargs)
+
+    async def __run_task(self):
+        loop = asyncio.get_running_loop()
+        executor = self.__interpreter.get_task_executor()
+        return await loop.run_in_executor(executor, self.__interpreter.run_task, self.run, self.__records)
+
+    def __await__(self):
+        return self.__run_task().__await__()
+
+
+async def gather(*awaitables, return_exceptions=False):
+    """ Lazy asyncio.gather: the awaitables are scheduled when the result is awaited. """
+    return list(await asyncio.gather(*awaitables, return_exceptions=return_exceptions))
+
+
 class Spaces():
     pass
 
 
 class ModuleClass(Spaces):
-    def __init__(self, interpreter, filename, name):
+    def __init__(self, interpreter, filename, name, lazy=False, shared=False):
         self.__filename = os.path.abspath(filename)
         self.__name = name
         self.__ar = None
-        self.make(interpreter)
+        self.__module_inter = None
+        self.__interpreter_class = interpreter.__class__
+        # Lazy modules are executed on first use, then registered in every importer (not kept alive).
+        # A shared module (see ModuleRegistry) is executed without the context of any importer.
+        self.__importers = weakref.WeakSet()
+        self.__context = None if shared else weakref.ref(interpreter)
+        self.__lock = threading.RLock()
+        if shared:
+            # Executed and registered by ModuleRegistry.load, outside of the registry lock.
+            pass
+
+        elif lazy:
+            self._register(interpreter, lazy=True)
+
+        else:
+            self.make(interpreter)
+
+    @property
+    def _filename(self):
+        return self.__filename
 
-    def make(self, interpreter):
-        module_inter = interpreter.__class__()
+    def make(self, interpreter=None):
+        """ Execute the module: with the settings and user objects of an interpreter, if given. """
+        module_inter = self.__interpreter_class()
+        if interpreter is not None:
+            module_inter.lazy_imports = interpreter.lazy_imports
+            if interpreter.profiler is not None:
+                module_inter.enable_profiler(interpreter.profiler)
+
+            if interpreter.tracer is not None:
+                interpreter.tracer.attach(module_inter)
+
+        else:
+            # Shared module: profiled and traced by the runs that execute its code (see RunHooks).
+            share_hooks(module_inter)
+
+        # The limits of the runs that import or call the module (see ResourceLimits).
+        check_runs(module_inter)
         module_inter.init_components(self.__name)
         # Set Main = False
         main = module_inter.get_main_AR()
@@ -342,31 +530,65 @@ class ModuleClass(Spaces):
         main['KANDY_MAIN'] = RecordConstant(False)
         main['KANDY_TYPE'] = RecordConstant("module")
         main.set_read_only(True)
-        # Copy user objects:
-        module_inter.copy_ar(interpreter.get_user_AR(), 2, ignore_read_only=True)
-        # GetCurrentModulesImported
-        module_inter.modules_imported.update(interpreter.modules_imported)
+        if interpreter is not None:
+            # Copy user objects:
+            module_inter.copy_ar(interpreter.get_user_AR(), 2, ignore_read_only=True)
+            # GetCurrentModulesImported
+            module_inter.modules_imported.update(interpreter.modules_imported)
+
         # Interpret
         module_inter.interpret_from_filename(self.__filename, reset=False)
         self.__ar = module_inter.get_global_AR()
+        self.__module_inter = module_inter
         # Add Protect:
         self.__ar.set_read_only(True)
 
+        if interpreter is not None:
+            self._register(interpreter)
+
+    def _register(self, interpreter, lazy=False):
+        """ Make the module (and the modules imported by it) available in the interpreter. """
         interpreter.modules_imported[self.__filename] = self
+        if self.__ar is None:
+            if lazy:
+                with self.__lock:
+                    if self.__ar is None:
+                        self.__importers.add(interpreter)
+                        return
+
+            else:
+                # Eager import ('import!' or lazy_imports disabled): execute it now.
+                self._load()
+
         interpreter.modules[self] = self.__ar
 
-        for k in module_inter.modules:
+        for k in self.__module_inter.modules:
             if k in interpreter.modules:
                 continue
 
-            interpreter.modules[k] = module_inter
+            interpreter.modules[k] = self.__module_inter
+
+    def _load(self):
+        """ Execute a lazy module (only the first time). """
+        if self.__ar is None:
+            with self.__lock:
+                if self.__ar is None:
+                    context = self.__context() if self.__context is not None else None
+                    self.make(context)
+                    for interpreter in list(self.__importers):
+                        self._register(interpreter)
+
+                    self.__importers = weakref.WeakSet()
+                    self.__context = None
+
+        return self
 
     def __getattr__(self, name):
         if name.startswith("_"):
             return self.__dict__[name]
 
         else:
-            return self.__ar.get(name)
+            return self._load().__ar.get(name)
 
     def __repr__(self):
         return f"Module(<Name: {self.__name!r}, File: {self.__filename}>)"
@@ -375,6 +597,266 @@ class ModuleClass(Spaces):
         return f"Module(<Name: {self.__name!r}, File: {self.__filename}>)"
 
 
+class ModuleRegistry():
+    """
+    Process-wide cache of the executed KandyScript modules.
+
+    The modules are keyed by absolute path and validated with the mtime and size of the file, so
+    a module imported by several interpreters is parsed and executed once per process. Its global
+    AR is read-only, so it can be shared.
+    """
+
+    def __init__(self):
+        self.__lock = threading.RLock()
+        self.__modules = {}  # filename: (stamp, module)
+        self.__trees = {}  # filename: (stamp, tree) of the preloaded modules
+
+    @staticmethod
+    def stamp(filename):
+        archive = find_archive(filename)
+        if archive is not None:
+            return archive.stamp
+
+        stat = os.stat(filename)
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def is_shareable(interpreter):
+        """ Modules can see the user objects of the importer: only share them without user objects. """
+        return all(key == "PROGRAM_START" for key, _ in interpreter.get_user_AR())
+
+    def get(self, filename):
+        """ Return the cached module of the file, or None if it is not cached or the file changed. """
+        entry = self.__modules.get(os.path.abspath(filename))
+        if entry is not None and entry[0] == self.stamp(filename):
+            return entry[1]
+
+        return None
+
+    def add_tree(self, filename, stamp, tree):
+        """ Keep the parsed tree of a module, executed later by its import statement. """
+        self.__trees[os.path.abspath(filename)] = (stamp, tree)
+
+    def get_tree(self, filename):
+        """ Return the parsed tree of a preloaded module, or None if it is not preloaded or changed. """
+        entry = self.__trees.get(os.path.abspath(filename))
+        if entry is not None and entry[0] == self.stamp(filename):
+            return entry[1]
+
+        archive = find_archive(filename)
+        if archive is not None:
+            tree = archive.tree(archive.member(filename))
+            self.add_tree(filename, archive.stamp, tree)
+            return tree
+
+        return None
+
+    def load(self, interpreter, filename, name, lazy=False):
+        """ Return the module of the file, executing it only if it is not cached yet. """
+        if not self.is_shareable(interpreter):
+            return ModuleClass(interpreter, filename, name, lazy)
+
+        filename = os.path.abspath(filename)
+        # The lock only guards the cache: the module is executed with its own lock (see ModuleClass._load),
+        # so the imports of a slow module do not block the imports of other threads.
+        with self.__lock:
+            module = self.get(filename)
+            created = module is None
+            if created:
+                module = ModuleClass(interpreter, filename, name, lazy, shared=True)
+                self.__modules[filename] = (self.stamp(filename), module)
+
+        try:
+            module._register(interpreter, lazy)
+
+        except BaseException:
+            if created:
+                with self.__lock:
+                    if self.__modules.get(filename, (None, None))[1] is module:
+                        del self.__modules[filename]
+
+            raise
+
+        return module
+
+    def reload(self, interpreter, module):
+        """ Execute the file of the module again (in the same module object) and cache it. """
+        stamp = self.stamp(module._filename)
+        module.make(interpreter)
+        with self.__lock:
+            if self.is_shareable(interpreter):
+                self.__modules[module._filename] = (stamp, module)
+
+            else:
+                self.__modules.pop(module._filename, None)
+
+        return module
+
+    def invalidate(self, filename=None):
+        """ Remove a file from the cache, or every file if no filename is given. """
+        with self.__lock:
+            if filename is None:
+                self.__modules.clear()
+                self.__trees.clear()
+
+            else:
+                self.__modules.pop(os.path.abspath(filename), None)
+                self.__trees.pop(os.path.abspath(filename), None)
+
+
+module_registry = ModuleRegistry()
+
+
+class ModuleIndex():
+    """
+    In-memory index of the directories searched for KandyScript modules.
+
+    The entries of a directory are listed once, and listed again only when the mtime of the
+    directory changes (checked at most once every `refresh_interval` seconds), so a lookup costs
+    no system calls within that interval. When every directory misses, the directories are checked
+    again at once (a file just written) and the names are compared ignoring the case (for the
+    case-insensitive file systems, confirmed with one stat of the path found).
+    """
+
+    def __init__(self, refresh_interval=1.0):
+        self.refresh_interval = refresh_interval
+        self.__directories = {}  # dirname: (checked_at, mtime, entries)
+
+    def entries(self, dirname, refresh=False):
+        """ Return the names inside a directory (empty if it does not exist). """
+        now = time.monotonic()
+        cached = self.__directories.get(dirname)
+        if cached is not None and not refresh and now - cached[0] < self.refresh_interval:
+            return cached[2]
+
+        try:
+            mtime = os.stat(dirname).st_mtime_ns
+            if cached is not None and cached[1] == mtime:
+                entries = cached[2]
+            else:
+                entries = frozenset(os.listdir(dirname))
+
+        except OSError:
+            mtime, entries = None, frozenset()
+
+        self.__directories[dirname] = (now, mtime, entries)
+        return entries
+
+    def find(self, parts, directories):
+        """ Return the path of parts (packages and file name) in the first directory that has it. """
+        for dirname in directories:
+            path = self.__lookup(dirname, parts)
+            if path is not None:
+                return path
+
+        # Every directory missed: list them again, in case the file is newer than the listings.
+        for dirname in directories:
+            path = self.__lookup(dirname, parts, refresh=True)
+            if path is not None:
+                return path
+
+        for dirname in directories:
+            path = self.__lookup(dirname, parts, ignore_case=True)
+            if path is not None and os.path.exists(os.path.join(dirname, *parts)):
+                return path
+
+        return None
+
+    def __lookup(self, dirname, parts, refresh=False, ignore_case=False):
+        path = dirname
+        for part in parts:
+            entries = self.entries(path, refresh)
+            if part not in entries:
+                if not ignore_case:
+                    return None
+
+                name = part.casefold()
+                part = next((entry for entry in entries if entry.casefold() == name), None)
+                if part is None:
+                    return None
+
+            path = os.path.join(path, part)
+
+        return path
+
+    def invalidate(self):
+        self.__directories.clear()
+
+
+module_index = ModuleIndex()
+
+
+class PythonModule(types.ModuleType):
+    """
+    Lazy 'python import': the module is found when the statement runs (a missing module raises
+    ModuleNotFoundError there), but it is executed on its first use (attribute access).
+
+    The proxies are cached by module name, so running the statement again does not import again.
+    """
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__module = None
+        self.__lock = threading.Lock()
+
+    def _load(self):
+        if self.__module is None:
+            with self.__lock:
+                if self.__module is None:
+                    self.__module = importlib.import_module(self.__name__)
+
+        return self.__module
+
+    def __getattr__(self, name):
+        if name.startswith("_PythonModule__"):
+            raise AttributeError(name)
+
+        return getattr(self._load(), name)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        if self.__module is None:
+            return f"<lazy python module {self.__name__!r}>"
+
+        return repr(self.__module)
+
+
+python_modules = {}  # name: PythonModule
+
+
+def python_import(name, package=None, lazy=True):
+    """
+    Import a python module: 'python import name' or 'python from package import name'.
+
+    Only plain imports are lazy: a from-import can bind any object of the package (not only
+    submodules), so it is resolved right away.
+    """
+    if package is None:
+        if not lazy or name in sys.modules:
+            return importlib.import_module(name)
+
+        module = python_modules.get(name)
+        if module is None:
+            if importlib.util.find_spec(name) is None:
+                raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+
+            module = python_modules.setdefault(name, PythonModule(name))
+
+        return module
+
+    fullname = f"{package}.{name}"
+    try:
+        return importlib.import_module(fullname)
+
+    except ModuleNotFoundError as e:
+        if e.name != fullname:
+            raise
+
+    return getattr(importlib.import_module(package), name)
+
+
 class SpaceClass(Spaces):
     def __init__(self, interpreter, ar, name):
         self.__ar = ar
@@ -538,26 +1020,34 @@ class LoopControl():
 
 # Take:
 # Function for the reserverd keyword "take" (ForInStatement)
+# - memoryview (and tuple) expressions are sliced: zero-copy chunks of the buffer,
+#   use: for chunk in memoryview(data) take 65536 (mapfile objects are sliced as memoryview)
+# - other iterables are consumed lazily with islice, one chunk at a time.
+ZERO_COPY_TYPES = (memoryview, tuple)
+
+
 def take_splitter(expression, count=2, values_to_unpack=1):
-    take = []
-    if values_to_unpack == 1:
-        for i in expression:
-            take.append(i)
-            if len(take) == count:
-                yield tuple(take)
-                take.clear()
+    if count < 1:
+        raise ValueError(f"The 'take' value must be greater than 0 (got {count!r}).")
 
-        if len(take) >= 1:
-            yield tuple(take)
-            take.clear()
+    if isinstance(expression, mmap.mmap):
+        expression = memoryview(expression)
 
-    elif values_to_unpack >= 2:
-        for i in expression:
-            take.append(i)
-            if len(take) == count:
-                yield tuple(zip(*take))
-                take.clear()
+    if values_to_unpack == 1 and isinstance(expression, ZERO_COPY_TYPES):
+        for pos in range(0, len(expression), count):
+            yield expression[pos:pos+count]
 
-        if len(take) >= 1:
+        return
+
+    iterator = iter(expression)
+    take = tuple(islice(iterator, count))
+    if values_to_unpack == 1:
+        while take:
+            yield take
+            take = tuple(islice(iterator, count))
+
+    elif values_to_unpack >= 2:
+        # Batched-zip: each variable receives a tuple with its values of the chunk.
+        while take:
             yield tuple(zip(*take))
-            take.clear()
+            take = tuple(islice(iterator, count))
@@ -0,0 +1,110 @@
+""" KandyScript archives: a script and the modules it imports, parsed, packed into one file. """
+
+import os
+import gc
+import json
+import mmap
+import pickle
+import zipfile
+
+ARCHIVE_FORMAT = 1
+ARCHIVE_MANIFEST = "__kandy_archive__.json"
+ARCHIVE_MAIN = "__main__.ks"
+ARCHIVE_LIBRARY = "lib"  # Modules found in the search path (KANDYPATH, lib directory).
+
+
+class _MappedFile(mmap.mmap):
+    """ Read-only map usable as the file of a ZipFile. """
+
+    def seekable(self):
+        return True
+
+
+class KandyArchive():
+    """
+    Memory-mapped archive (a zip file) with the parsed trees of a script and its modules.
+
+    The members are addressed with virtual filenames inside the archive path (like zipimport):
+    'app.ksa/__main__.ks', 'app.ksa/lib/testlib/imath.ks', ...
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.stamp = self.stamp_of(self.path)
+
+        with open(self.path, "rb") as f:
+            self.__map = _MappedFile(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.__zip = zipfile.ZipFile(self.__map)
+        self.members = frozenset(self.__zip.namelist())
+
+        manifest = json.loads(self.__zip.read(ARCHIVE_MANIFEST))
+        if manifest.get("format") != ARCHIVE_FORMAT:
+            raise ValueError(f"Unsupported KandyScript archive format: {manifest.get('format')!r}.")
+
+    @staticmethod
+    def stamp_of(path):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def __repr__(self):
+        return f"KandyArchive(<File: {self.path}, Modules: {len(self.members)-1}>)"
+
+    def filename(self, member):
+        """ Virtual filename of a member. """
+        return os.path.join(self.path, *member.split("/"))
+
+    def member(self, filename):
+        """ Member name of a virtual filename. """
+        return os.path.relpath(filename, self.path).replace(os.sep, "/")
+
+    def tree(self, member):
+        """ Return the parsed tree of a member. """
+        # Unpickling only creates objects: a full collection per allocation threshold is wasted time.
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return pickle.loads(self.__zip.read(member))
+
+        finally:
+            if enabled:
+                gc.enable()
+
+    def find(self, parts, dirname):
+        """ Return the virtual filename of a module, searched in a member directory, then in the library. """
+        for base in (dirname, ARCHIVE_LIBRARY):
+            member = "/".join([part for part in (base, *parts) if part and part != "."])
+            if member in self.members:
+                return self.filename(member)
+
+        return None
+
+
+archives = {}  # path: KandyArchive
+
+
+def open_archive(path):
+    """ Return the opened archive of a path (opened again if the file changed). """
+    path = os.path.abspath(path)
+    archive = archives.get(path)
+    if archive is None or archive.stamp != KandyArchive.stamp_of(path):
+        archive = archives[path] = KandyArchive(path)
+
+    return archive
+
+
+def find_archive(filename):
+    """ Return the opened archive that contains a virtual filename, or None. """
+    for path, archive in archives.items():
+        if filename.startswith(path + os.sep):
+            return archive
+
+    return None
+
+
+def write_archive(output, trees):
+    """ Write an archive from a dict {member: tree}; the main script is ARCHIVE_MAIN. """
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_STORED) as archive:
+        archive.writestr(ARCHIVE_MANIFEST, json.dumps({"format": ARCHIVE_FORMAT, "main": ARCHIVE_MAIN}))
+        for member, tree in trees.items():
+            archive.writestr(member, pickle.dumps(tree, protocol=pickle.HIGHEST_PROTOCOL))
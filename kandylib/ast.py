@@ -1,4 +1,8 @@
 
+import pathlib
+from functools import partial
+
+from . import kandyerrors as kerr
 from .undefined import UNDEFINED_TYPE
 from .tokentype import TokenType
 
@@ -9,7 +13,8 @@ __all__ = ['AST', 'Empty', 'ValueAST', 'BinOp', 'UnaryOp', 'StarredTuple', 'Star
            'Param', 'Call', 'ScriptAction', 'WhileStatement', 'UntilStatement', 'ForInStatement',
            'ForFromToStatement', 'ForCStatement', 'RepeatStatement', 'SwitchCaseStatement',
            'SwitchCaseItem', 'WhenCaseStatement', 'WhenCaseItem', 'WithStatement', 'TryStatement',
-           'ExceptBlock', 'ImportStatement', 'UsingStatement', 'ClassStatement']
+           'ExceptBlock', 'ImportStatement', 'UsingStatement', 'ClassStatement', 'AwaitExpr',
+           'SubexpressionScope', 'SharedSubexpression']
 
 
 # AST
@@ -104,6 +109,26 @@ class IfNotNullExpr(AST):
         self.on_false = value_false
 
 
+class AwaitExpr(AST):
+    def __init__(self, token, value):
+        self.token = token
+        self.value = value
+
+
+class SubexpressionScope(AST):
+    """ Expression with SharedSubexpressions: their values are kept only while it is evaluated. """
+    def __init__(self, expression, count):
+        self.expression = expression
+        self.count = count
+
+
+class SharedSubexpression(AST):
+    """ Attribute/Slicing repeated inside a SubexpressionScope (see kandylib.optimizer). """
+    def __init__(self, index, expression):
+        self.index = index
+        self.expression = expression
+
+
 # AST: Estructuras
 class Compound(AST):
     def __init__(self, return_action=False):
@@ -190,11 +215,60 @@ class RepeatStatement(AST):
         self.variable = var_name
 
 
+# Types of the values that can be looked up in the case tables (hash and == agree with the literals).
+CASE_TABLE_TYPES = frozenset({int, float, complex, bool, str, bytes, type(None)})
+
+
+def literal_value(node):
+    """ Return (True, value) of a literal expression, or (False, None). """
+    if isinstance(node, (Number, Bool)):
+        return True, node.value
+
+    elif isinstance(node, NoneValue):
+        return True, None
+
+    elif isinstance(node, String) and node.parts is None and node.type != "path":
+        return True, node.value
+
+    elif (isinstance(node, UnaryOp) and isinstance(node.value, Number)
+          and node.token.type in (TokenType.MINUS, TokenType.PLUS)):
+        return True, -node.value.value if node.token.type == TokenType.MINUS else node.value.value
+
+    return False, None
+
+
+def case_table(items, first_only=False):
+    """
+    Dispatch table of switch/when items whose cases are all literals: {value: index of the items}
+    (all the matching items in order, or only the first one). None if any case is not a literal.
+    """
+    table = {}
+    for index, item in enumerate(items):
+        if item is None:
+            return None
+
+        for case in item.cases:
+            is_literal, value = literal_value(case)
+            if not is_literal or value.__class__ not in CASE_TABLE_TYPES:
+                return None
+
+            indexes = table.setdefault(value, [])
+            if not indexes or indexes[-1] != index:
+                indexes.append(index)
+
+    if first_only:
+        return {value: indexes[0] for value, indexes in table.items()}
+
+    return {value: tuple(indexes) for value, indexes in table.items()}
+
+
 class SwitchCaseStatement(AST):
     def __init__(self, compare_expression, cases, default_block):
         self.cases = cases
         self.default_block = default_block
         self.compare_expression = compare_expression
+        # {value: index of the matching items} when all the cases are literals (built once), else None.
+        self.table = case_table(cases)
 
 
 class SwitchCaseItem(AST):
@@ -209,6 +283,8 @@ class WhenCaseStatement(AST):
         self.cases = cases
         self.default_block = default_block
         self.compare_expression = compare_expression
+        # {value: index of the first matching item} when all the cases are literals, else None.
+        self.table = case_table(cases, first_only=True)
 
 
 class WhenCaseItem(AST):
@@ -241,10 +317,11 @@ class ExceptBlock(AST):
 
 
 class ImportStatement(AST):
-    def __init__(self, modules=None, package=None, is_python_file=False):
+    def __init__(self, modules=None, package=None, is_python_file=False, eager=False):
         self.module_names = modules
         self.package = package
         self.is_python_file = is_python_file
+        self.eager = eager
 
 
 class UsingStatement(AST):
@@ -287,51 +364,109 @@ class Undefined(AST):
         self.token = token
 
 
+CONVERSIONS = {"r": repr, "s": str, "a": ascii}
+
+
+def _format_value(spec, value):
+    return format(value, spec)
+
+
+def _format_converted(conversion, spec, value):
+    return format(conversion(value), spec)
+
+
 class String(AST):
-    def __init__(self, token):
+    def __init__(self, token, parser=None):
         self.token = token
         self.type = token.value[0]
         self.mode = token.value[1]
         self.content = token.value[2]
-        self.expr = token.value[3]
-        self.expr_ast = {}
-        self.expr_form = {}
-
-    def evaluate_expressions(self, interpreter):
-        output = {}
-        if len(self.expr) >= 1:
-            if not len(self.expr_ast) == len(self.expr):
-                self.generate_ast(interpreter.parser)
-
-            for name, ast in self.expr_ast.items():
-                form = self.expr_form.get(name, None)
-                if form:
-                    output[name] = form.format(interpreter.visit(ast))
-                else:
-                    output[name] = interpreter.visit(ast)
-
-        return output
-
-    def generate_ast(self, parser):
-        if len(self.expr) >= 1:
-            self.expr_ast.clear()
-            for name, expr in self.expr.items():
-                self.expr_ast[name] = parser.parse_expr(expr)
-
-                if not parser.current_token.type == TokenType.EOF:
-                    parser.lexer.back(parser.current_token.pos-1)
-                    remaining = parser.lexer.get_remaining_text()
-                    if remaining.endswith("="):
-                        remaining = remaining[:-1]
-                        consume_text = parser.lexer.get_consumed_text()
-                        self.expr_form[name] = consume_text+"={0"+remaining+"}"
-
-                    else:
-                        self.expr_form[name] = "{0"+remaining+"}"
+        # Literal strings and (ast, render) expression parts, joined on evaluation.
+        # None when the string has no expressions: the constant value is returned instead.
+        self.parts = None
+        self.value = None
+        if token.value[3]:
+            self.parts = self.compile_parts(token.value[3], parser)
+        else:
+            self.value = self.constant()
+
+    def constant(self):
+        """ Value of a string without expressions, built only once. """
+        if self.type == "path":
+            return pathlib.Path(self.content)
+
+        return self.content
+
+    def compile_parts(self, segments, parser):
+        """ Parse the expressions of the string with its own parser (not the one of the program). """
+        parts = []
+        for literal, expression in segments:
+            ast = parser.parse_expr(expression)
+            token = parser.current_token
+
+            render = format
+            if not token.type == TokenType.EOF:
+                remaining = expression[token.pos-1:]
+                if token.type == TokenType.ASSIGN:
+                    # Debug form: {expr=}, {expr = } or {expr=:spec}
+                    remaining = remaining[1:].lstrip()
+                    literal += expression[:len(expression)-len(remaining)]
+
+                elif remaining.endswith("="):
+                    # Debug form after the conversion: {expr!r=}
+                    remaining = remaining[:-1]
+                    literal += expression[:token.pos-1] + "="
+
+                if remaining:
+                    render = self.compile_format(remaining)
+
+            if literal:
+                parts.append(literal)
+            parts.append((ast, render))
+
+        if self.content:
+            parts.append(self.content)
+
+        return parts
+
+    @staticmethod
+    def compile_format(form):
+        """
+        Return the render function of a '!conversion:spec' form, parsed only once.
+        Invalid conversions raise at parse time, but the spec is checked by format() when rendered:
+        its syntax depends on the type of the value ('%Y' is valid for a datetime, not for an int).
+        """
+        conversion, spec = None, ""
+        if form.startswith("!"):
+            conversion = CONVERSIONS.get(form[1:2], None)
+            if conversion is None or not form[2:3] in ("", ":"):
+                raise kerr.KandySyntaxError(f"Invalid conversion in the string expression: '{form}'.")
+            form = form[2:]
+
+        if form.startswith(":"):
+            spec = form[1:]
+        elif form:
+            raise kerr.KandySyntaxError(f"Invalid format in the string expression: '{form}'.")
+
+        if not spec:
+            return conversion or format
+
+        # partial (not lambda) keeps the tree picklable: modules can be parsed in other processes.
+        if conversion is None:
+            return partial(_format_value, spec)
+
+        return partial(_format_converted, conversion, spec)
 
 
 class Bytes(String):
-    pass
+    def __init__(self, token, parser=None):
+        super().__init__(token, parser)
+        if self.parts is not None:
+            # Literal parts encoded once: only the expressions are encoded on evaluation.
+            self.parts = [part.encode() if part.__class__ is str else part for part in self.parts]
+
+    def constant(self):
+        return self.content.encode()
 
 
 class Tuple(AST):
@@ -372,12 +507,14 @@ class ProcedureDecl(AST):
 
 
 class FunctionDecl(AST):
-    def __init__(self, name, params, block, type_=None, is_local=False):
+    def __init__(self, name, params, block, type_=None, is_local=False, is_async=False, is_generator=False):
         self.name = name
         self.params = params
         self.block = block
         self.type = type_  # Data-Type of return statement.
         self.is_local = is_local
+        self.is_async = is_async  # True: calls return a KandyCoroutine.
+        self.is_generator = is_generator  # True: the block contains 'yield' statements.
 
 
 class LambdaDecl(AST):
@@ -413,5 +550,4 @@ class ScriptAction(AST):
     def __init__(self, token, expression):
         self.token = token
         self.action = token.value
-        self.data = None
         self.expression = expression
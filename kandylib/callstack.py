@@ -58,6 +58,26 @@ class CallStack():
     def get(self, index):
         return self._records[min(len(self._records), index)]
 
+    def detach(self):
+        """ Remove and return the current records (used to switch between coroutine-tasks). """
+        records = self._records
+        self._records = []
+        return records
+
+    def attach(self, records):
+        """ Replace the current records with a detached list. """
+        self._records = records
+
+    def cut(self, depth):
+        """ Remove and return the records above 'depth' (used to suspend generators). """
+        records = self._records[depth:]
+        del self._records[depth:]
+        return records
+
+    def extend(self, records):
+        """ Push again the records removed with 'cut'. """
+        self._records.extend(records)
+
 
 class ARType(Enum):
     BUILTIN = "BuiltIn"
@@ -0,0 +1,115 @@
+""" Method hooks: wrappers of the methods of an instance, installed by several features in any order. """
+
+import threading
+import weakref
+
+
+class MethodHooks():
+    """
+    Chains of wrappers of the methods of objects (an interpreter, its call-stack), used by the
+    profiler, the tracer and the resource limits. A wrapper is a function of the method it wraps
+    (the class method or the previous wrapper) that returns the new method. The wrapped method
+    is set on the instance only while it has wrappers, and removing the wrappers of an owner
+    rebuilds the chain with the wrappers of the others.
+    """
+
+    def __init__(self):
+        self.__chains = {}  # (id(target), name): (target, [(owner, wrapper)])
+
+    def add(self, owner, target, name, wrapper):
+        """ Wrap the method `name` of target (after the current wrappers). """
+        key = (id(target), name)
+        target, wrappers = self.__chains.setdefault(key, (target, []))
+        wrappers.append((owner, wrapper))
+        self.__install(target, name, wrappers)
+
+    def remove(self, owner):
+        """ Remove the wrappers of an owner, keeping the others. """
+        for key, (target, wrappers) in list(self.__chains.items()):
+            kept = [item for item in wrappers if item[0] is not owner]
+            if len(kept) != len(wrappers):
+                wrappers[:] = kept
+                self.__install(target, key[1], wrappers)
+                if not wrappers:
+                    del self.__chains[key]
+
+    @staticmethod
+    def __install(target, name, wrappers):
+        target.__dict__.pop(name, None)
+        if wrappers:
+            method = getattr(target, name)
+            for _, wrapper in wrappers:
+                method = wrapper(method)
+
+            target.__dict__[name] = method
+
+
+_runs = threading.local()  # .stack: RunHooks of the runs executing in the thread (the innermost last).
+_runs_lock = threading.Lock()
+_active_runs = []  # RunHooks started in all the threads.
+_shared = weakref.WeakSet()  # Interpreters shared between the runs (see share_hooks).
+
+
+def current_run():
+    """ Return the RunHooks of the run executing in this thread (the innermost one), or None. """
+    stack = getattr(_runs, "stack", None)
+    return stack[-1] if stack else None
+
+
+def share_hooks(interpreter):
+    """
+    Apply the wrappers of the runs (the current ones and the later ones) to an interpreter shared
+    between the runs: the interpreters of the modules (see RunHooks).
+    """
+    with _runs_lock:
+        _shared.add(interpreter)
+        for run in _active_runs:
+            run.apply(interpreter)
+
+
+class RunHooks():
+    """
+    Wrappers that a run applies to the shared interpreters while it executes, like the profiler and
+    the tracer of the interpreter running. `wrappers` is a function of a shared interpreter that
+    returns its (method name, wrapper) pairs. The wrapped methods call the wrappers only inside the
+    run (in its thread), so the runs of other interpreters (and threads) are not observed.
+    """
+
+    def __init__(self, wrappers):
+        self.wrappers = wrappers
+
+    def start(self):
+        stack = getattr(_runs, "stack", None)
+        if stack is None:
+            stack = _runs.stack = []
+
+        stack.append(self)
+        with _runs_lock:
+            _active_runs.append(self)
+            for interpreter in list(_shared):
+                self.apply(interpreter)
+
+    def stop(self):
+        _runs.stack.remove(self)
+        with _runs_lock:
+            _active_runs.remove(self)
+            for interpreter in list(_shared):
+                interpreter.hooks.remove(self)
+
+    def apply(self, interpreter):
+        for name, wrapper in self.wrappers(interpreter):
+            interpreter.hooks.add(self, interpreter, name, self.__inside_run(wrapper))
+
+    def __inside_run(self, wrapper):
+        def run_wrapper(method):
+            wrapped = wrapper(method)
+
+            def run_method(*args):
+                if current_run() is self:
+                    return wrapped(*args)
+
+                return method(*args)
+
+            return run_method
+
+        return run_wrapper
@@ -2,6 +2,117 @@ import random
 import math
 import re
 import hashlib
+import mmap
+from functools import lru_cache
+from types import FunctionType, MethodType
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+# Parallel helpers:
+def _parallel_map(func, iterable, workers=None, chunksize=1, mode="thread"):
+    """
+    Map func over iterable with a pool of workers, preserving the order.
+
+    KandyScript functions share the call-stack of their interpreter, so they always run in the calling
+    thread: with the defaults (workers=None, mode='thread') the map is serial, and asking for workers
+    or a process pool raises ValueError instead of silently running serially.
+    """
+    if mode not in ("thread", "process"):
+        raise ValueError("Invalid parallel mode. Values: 'thread', 'process'")
+
+    if workers is not None and workers <= 1:
+        return list(map(func, iterable))
+
+    if getattr(func, "uses_call_stack", False):
+        if workers is not None or mode == "process":
+            raise ValueError("KandyScript functions can't run in parallel: use a Python callable, "
+                             "or call without 'workers' and 'mode' to run serially.")
+
+        return list(map(func, iterable))
+
+    if mode == "process":
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(func, iterable, chunksize=max(1, chunksize)))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(func, iterable))
+
+
+def _parallel_filter(func, iterable, workers=None, chunksize=1, mode="thread"):
+    """ Filter iterable testing func with a pool of workers, preserving the order. """
+    values = list(iterable)
+    tests = _parallel_map(func, values, workers, chunksize, mode)
+    return [value for value, test in zip(values, tests) if test]
+
+
+# Regex helpers:
+REGEX_CACHE_SIZE = 256  # Compiled patterns kept by the regex helpers (least recently used are dropped).
+
+
+@lru_cache(maxsize=REGEX_CACHE_SIZE)
+def _compile_regex(pattern, flags):
+    return re.compile(pattern, flags)
+
+
+def compile_regex(pattern, flags=None):
+    """ Compiled pattern of the regex helpers, cached by (pattern, flags). """
+    if isinstance(pattern, re.Pattern):
+        return pattern if not flags else re.compile(pattern.pattern, pattern.flags | flags)
+
+    return _compile_regex(pattern, flags or 0)
+
+
+def _literal_template(newvalue):
+    """ Replacement of re.sub inserted as is: backslashes are not escapes of groups. """
+    if callable(newvalue) or not (b"\\" if isinstance(newvalue, bytes) else "\\") in newvalue:
+        return newvalue
+
+    return lambda match: newvalue
+
+
+# Special attributes:
+_SPECIAL_ATTRIBUTES = {}  # (class, name): attribute defined by the class, or None (an attribute of the value).
+
+
+def special_attribute(class_, name):
+    """ Attribute `name` defined by a special-attributes class (not by its builtin base), or None. """
+    key = (class_, name)
+    try:
+        return _SPECIAL_ATTRIBUTES[key]
+
+    except KeyError:
+        attribute = None
+        if not (name.startswith("__") and name.endswith("__")):
+            for base in class_.__mro__:
+                if base.__module__ == "builtins":
+                    break
+
+                if name in base.__dict__:
+                    attribute = base.__dict__[name]
+                    break
+
+        _SPECIAL_ATTRIBUTES[key] = attribute
+        return attribute
+
+
+def bind_special_attribute(class_, obj, name):
+    """
+    Attribute of a value with the special attributes of a class: the functions of the class are bound
+    to the value itself (never converted to the class, a copy of the value).
+    """
+    attribute = special_attribute(class_, name)
+    if attribute is None:
+        return getattr(obj, name)
+
+    elif attribute.__class__ is FunctionType:
+        return MethodType(attribute, obj)
+
+    return attribute
+
+
+def special_dir(class_, obj):
+    """ dir() of a value with the special attributes of a class. """
+    return sorted(set(dir(obj)).union(name for name in dir(class_) if special_attribute(class_, name) is not None))
 
 
 class KandyInt(int):
@@ -155,30 +266,28 @@ class KandyStr(str):
         return output
 
     def replace_regex(self, pattern, newvalue, nmax=-1, flags=None) -> str:
-        string = self
-        count = 0
-        for match in re.finditer(pattern, string, flags):
-            pos, endpos = match.span()
-            string = string[:pos] + newvalue + string[endpos:]
-            count += 1
-
-            if count == nmax:
-                break
-
-        return string
+        """ Replace the first `nmax` matches (all if nmax <= 0) with a text or function(match). """
+        return compile_regex(pattern, flags).sub(_literal_template(newvalue), self, max(nmax, 0))
 
     def split_regex(self, pattern, nmax=-1, flags=None) -> tuple:
-        return re.split(pattern, self, nmax, flags)
+        """ Split by the matches, at most `nmax` times (all if nmax <= 0). """
+        return compile_regex(pattern, flags).split(self, max(nmax, 0))
 
-    def find_regex(self, pattern) -> tuple:
-        for match in re.finditer(pattern, self):
-            pos, endpos = match.span()
-            return (match.group(), pos, endpos)
+    def find_regex(self, pattern, flags=None) -> tuple:
+        """ Return (text, pos, endpos) of the first match, or None. """
+        match = compile_regex(pattern, flags).search(self)
+        if match is None:
+            return None
 
-        return None
+        return (match.group(), *match.span())
 
-    def match_regex(self, pattern) -> str:
-        return re.match(pattern, self)
+    def iter_regex(self, pattern, flags=None):
+        """ Yield (text, pos, endpos) of the matches, found lazily. """
+        for match in compile_regex(pattern, flags).finditer(self):
+            yield (match.group(), *match.span())
+
+    def match_regex(self, pattern, flags=None) -> str:
+        return compile_regex(pattern, flags).match(self)
 
     def get_sha3(self, mode=256) -> str:
         encoded = self.encode()
@@ -264,11 +373,7 @@ class KandyList(list):
 
             return self
         else:
-            result = []
-            for i in map(func, ls):
-                result.append(i)
-
-            return result
+            return list(map(func, self))
 
     def filter(self, func):
         ls = self.copy()
@@ -279,6 +384,26 @@ class KandyList(list):
     def map(self, func):
         return map(func, self)
 
+    def pfor_each(self, func, save=True, workers=None, chunksize=1, mode="thread"):
+        """ Parallel version of for_each (mode: 'thread' or 'process'). """
+        result = _parallel_map(func, self, workers, chunksize, mode)
+        if save:
+            self.clear()
+            self.extend(result)
+            return self
+
+        return result
+
+    def pfilter(self, func, workers=None, chunksize=1, mode="thread"):
+        """ Parallel version of filter (mode: 'thread' or 'process'). """
+        result = _parallel_filter(func, self, workers, chunksize, mode)
+        self.clear()
+        self.extend(result)
+
+    def pmap(self, func, workers=None, chunksize=1, mode="thread"):
+        """ Parallel version of map, return a list (mode: 'thread' or 'process'). """
+        return _parallel_map(func, self, workers, chunksize, mode)
+
 
 class KandyTuple(tuple):
     def random_choice(self, number=1):
@@ -303,6 +428,18 @@ class KandyTuple(tuple):
     def map(self, func):
         return map(func, self)
 
+    def pfor_each(self, func, workers=None, chunksize=1, mode="thread"):
+        """ Parallel version of for_each (mode: 'thread' or 'process'). """
+        return tuple(_parallel_map(func, self, workers, chunksize, mode))
+
+    def pfilter(self, func, workers=None, chunksize=1, mode="thread"):
+        """ Parallel version of filter (mode: 'thread' or 'process'). """
+        return tuple(_parallel_filter(func, self, workers, chunksize, mode))
+
+    def pmap(self, func, workers=None, chunksize=1, mode="thread"):
+        """ Parallel version of map, return a tuple (mode: 'thread' or 'process'). """
+        return tuple(_parallel_map(func, self, workers, chunksize, mode))
+
 
 class KandyDict(dict):
     def random_choice(self, number=1):
@@ -334,3 +471,105 @@ class KandyDict(dict):
 
     def map(self, func):
         return map(func, self.items())
+
+    def pfor_each(self, func, workers=None, chunksize=1, mode="thread"):
+        """ Parallel version of for_each (mode: 'thread' or 'process'). """
+        return dict(_parallel_map(func, self.items(), workers, chunksize, mode))
+
+    def pfilter(self, func, workers=None, chunksize=1, mode="thread"):
+        """ Parallel version of filter (mode: 'thread' or 'process'). """
+        return dict(_parallel_filter(func, self.items(), workers, chunksize, mode))
+
+    def pmap(self, func, workers=None, chunksize=1, mode="thread"):
+        """ Parallel version of map, return a list (mode: 'thread' or 'process'). """
+        return _parallel_map(func, self.items(), workers, chunksize, mode)
+
+
+def _bytes_pattern(pattern):
+    if isinstance(pattern, str):
+        return pattern.encode()
+
+    return pattern
+
+
+class KandyMappedFile():
+    """
+    Special attributes of the memory-mapped files (mapfile): bound to the mmap itself (see
+    bind_special_attribute), so the file is never copied.
+    """
+
+    def replace_regex(self, pattern, newvalue, nmax=-1, flags=None) -> bytes:
+        if isinstance(newvalue, str):
+            newvalue = newvalue.encode()
+
+        return KandyStr.replace_regex(self, _bytes_pattern(pattern), newvalue, nmax, flags)
+
+    def split_regex(self, pattern, nmax=-1, flags=None) -> tuple:
+        return KandyStr.split_regex(self, _bytes_pattern(pattern), nmax, flags)
+
+    def find_regex(self, pattern, flags=None) -> tuple:
+        return KandyStr.find_regex(self, _bytes_pattern(pattern), flags)
+
+    def iter_regex(self, pattern, flags=None):
+        """ Yield (bytes, pos, endpos) of the matches, scanning the file lazily. """
+        return KandyStr.iter_regex(self, _bytes_pattern(pattern), flags)
+
+    def match_regex(self, pattern, flags=None):
+        return KandyStr.match_regex(self, _bytes_pattern(pattern), flags)
+
+    def lines(self):
+        """ Iterate the lines of the file (bytes) without loading it. """
+        self.seek(0)
+        return iter(self.readline, b"")
+
+
+class EmptyMappedFile(bytes):
+    """
+    mapfile() of an empty file (mmap can't map 0 bytes): empty bytes with the file methods of mmap
+    used by the scripts, and the same special attributes (KandyMappedFile).
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return None
+
+    @property
+    def closed(self):
+        return False
+
+    def close(self):
+        pass
+
+    def flush(self, *args):
+        pass
+
+    def size(self):
+        return 0
+
+    def tell(self):
+        return 0
+
+    def seek(self, pos, whence=0):
+        return None
+
+    def read(self, n=None):
+        return b""
+
+    def readline(self):
+        return b""
+
+    def read_byte(self):
+        raise ValueError("read byte out of range")
+
+
+def mapfile(path, write=False):
+    """ Map a file in memory: bytes-like object (slicing, 'take', regex helpers). """
+    mode = "r+b" if write else "rb"
+    access = mmap.ACCESS_WRITE if write else mmap.ACCESS_READ
+    with open(path, mode) as file:
+        if file.seek(0, 2) == 0:
+            return EmptyMappedFile()
+
+        return mmap.mmap(file.fileno(), 0, access=access)
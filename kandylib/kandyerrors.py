@@ -7,6 +7,7 @@ Exception (python Exceptions Class)
 +-- KandyBaseException
     +-- KandySystemExit
     +-- KandyKeyboardInterrupt
+    +-- KandyResourceLimitError
     +-- KandyException
         +-- KandyLexerError
         +-- KandyParserError
@@ -42,6 +43,11 @@ class KandyKeyboardInterrupt(KandyBaseException):
     pass
 
 
+# A run exceeded its resource limits (see kandylib.limits).
+class KandyResourceLimitError(KandyBaseException):
+    pass
+
+
 # Exception is an important class that contains a big variety of sub-exceptions class.
 class KandyException(KandyBaseException):
     pass
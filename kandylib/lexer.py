@@ -269,7 +269,7 @@ class Lexer():
 
         string_mode = None
         string_content = ""
-        expressions = {}
+        segments = []  # (literal text, expression source) pairs before the last literal.
         if self.current_char in ("'", '"'):
             string_mode = self.current_char
             self.advance()
@@ -351,9 +351,11 @@ class Lexer():
                             expression += self.current_char
                             self.advance()
 
-                    name = "expr"+str(len(expressions))
-                    expressions[name] = expression
-                    string_content += "{"+name+"}"
+                    if expression:
+                        segments.append((string_content, expression))
+                        string_content = ""
+                    else:
+                        string_content += "$"
 
                 # Insert expression: {expr}
                 elif self.current_char == "{" and string_type not in ("raw", "normal", "path"):
@@ -382,9 +384,8 @@ class Lexer():
                     if self.current_char == "}":
                         self.advance()
 
-                    name = "expr"+str(len(expressions))
-                    expressions[name] = expression
-                    string_content += "{"+name+"}"
+                    segments.append((string_content, expression))
+                    string_content = ""
 
                 # Default
                 else:
@@ -394,7 +395,7 @@ class Lexer():
             if not string_bytes:
                 return Token(
                     type_=TokenType.STRING,
-                    value=(string_type, string_mode, string_content, expressions),
+                    value=(string_type, string_mode, string_content, segments),
                     pos=pos_start,
                     column=column_start,
                     lineno=lineno_start,
@@ -403,7 +404,7 @@ class Lexer():
             else:
                 return Token(
                     type_=TokenType.BYTES,
-                    value=(string_type, string_mode, string_content, expressions),
+                    value=(string_type, string_mode, string_content, segments),
                     pos=pos_start,
                     column=column_start,
                     lineno=lineno_start,
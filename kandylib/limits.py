@@ -0,0 +1,187 @@
+""" Resource limits of the interpreters: step budget, wall-clock timeout, memory cap and cancellation. """
+
+import time
+import threading
+import tracemalloc
+
+from . import kandyerrors as kerr
+
+_runs = threading.local()  # .limits: ResourceLimits of the runs of the thread (the innermost last).
+_runs_lock = threading.Lock()
+_limited_runs = 0  # Limited runs in all the threads: the checks cost nothing without them.
+
+
+class CancellationToken():
+    """
+    Flag to cancel the runs of the interpreters from another thread (see Interpreter.set_limits).
+    The running scripts raise KandyKeyboardInterrupt at their next loop iteration or call.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+
+    def __repr__(self):
+        return f"CancellationToken(<cancelled={self.cancelled}>)"
+
+    def cancel(self):
+        self.cancelled = True
+
+    def reset(self):
+        """ Allow new runs (for example, of an interpreter returned to a pool). """
+        self.cancelled = False
+
+
+class ResourceLimits():
+    """
+    Budget of a run (see Interpreter.set_limits), checked at each loop iteration and call:
+
+        max_steps: loop iterations plus records pushed to the call-stack (calls, classes, ...).
+        timeout: seconds since the start of the run.
+        max_memory: bytes allocated since the start of the run (traced with tracemalloc, checked
+                    every `memory_interval` steps).
+        token: CancellationToken of the run, a cancelled run raises KandyKeyboardInterrupt.
+
+    Once a limit is exceeded (or the token cancelled) every check raises, so a script can not
+    catch the error and keep running. A run of a module inside a run shares its budget.
+
+    The interpreters check the limits of the run executing in their thread (see current_limits),
+    not the ones they were created with: the modules are shared between interpreters, so the
+    code of a module counts in the budget of the run that calls it.
+    """
+
+    def __init__(self, max_steps=None, timeout=None, max_memory=None, memory_interval=1000, token=None):
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.max_memory = max_memory
+        self.memory_interval = memory_interval
+        self.token = token
+        self.steps = 0
+        self.__deadline = None
+        self.__memory_start = 0
+        self.__tracemalloc = False  # Started by this object.
+        self.__depth = 0
+
+    def __repr__(self):
+        return (f"ResourceLimits(<max_steps={self.max_steps}, timeout={self.timeout}, "
+                f"max_memory={self.max_memory}, steps={self.steps}>)")
+
+    @property
+    def running(self):
+        return self.__depth > 0
+
+    def start(self):
+        """ Start the budget of a run (nested runs keep the budget of the outermost one). """
+        global _limited_runs
+        runs = getattr(_runs, "limits", None)
+        if runs is None:
+            runs = _runs.limits = []
+
+        runs.append(self)
+        with _runs_lock:
+            _limited_runs += 1
+
+        if not self.__depth:
+            self.steps = 0
+            self.__deadline = time.perf_counter() + self.timeout if self.timeout is not None else None
+            if self.max_memory is not None:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    self.__tracemalloc = True
+
+                self.__memory_start = tracemalloc.get_traced_memory()[0]
+
+        self.__depth += 1
+
+    def stop(self):
+        global _limited_runs
+        _runs.limits.pop()
+        with _runs_lock:
+            _limited_runs -= 1
+
+        self.__depth -= 1
+        if not self.__depth and self.__tracemalloc:
+            tracemalloc.stop()
+            self.__tracemalloc = False
+
+    def check(self):
+        """ Count a step: raise KandyKeyboardInterrupt if cancelled, KandyResourceLimitError if over a limit. """
+        if not self.__depth:
+            return
+
+        if self.token is not None and self.token.cancelled:
+            raise kerr.KandyKeyboardInterrupt(message="The run was cancelled.")
+
+        self.steps += 1
+        if self.max_steps is not None and self.steps > self.max_steps:
+            raise kerr.KandyResourceLimitError(message=f"Step limit exceeded ({self.max_steps} steps).")
+
+        if self.__deadline is not None and time.perf_counter() > self.__deadline:
+            raise kerr.KandyResourceLimitError(message=f"Time limit exceeded ({self.timeout} seconds).")
+
+        if self.max_memory is not None and not self.steps % self.memory_interval:
+            memory = tracemalloc.get_traced_memory()[0] - self.__memory_start
+            if memory > self.max_memory:
+                raise kerr.KandyResourceLimitError(
+                    message=f"Memory limit exceeded ({memory} of {self.max_memory} bytes).")
+
+    def attach(self, interpreter):
+        """ Limit the runs of the interpreter instance: check them at its loop iterations and calls. """
+        interpreter.limits = self
+        _add_checks(interpreter, self)
+
+    def detach(self, interpreter):
+        interpreter.limits = None
+        interpreter.hooks.remove(self)
+
+
+def current_limits():
+    """ Return the ResourceLimits of the run executing in this thread (the innermost limited one), or None. """
+    runs = getattr(_runs, "limits", None)
+    return runs[-1] if runs else None
+
+
+def check_current_run():
+    """ Check the limits of the run executing in this thread, if any (see ResourceLimits.check). """
+    if _limited_runs:
+        limits = current_limits()
+        if limits is not None:
+            limits.check()
+
+
+def check_runs(interpreter):
+    """
+    Check the limits of the current runs at the loop iterations and calls of an interpreter
+    without limits of its own: the interpreters of the modules, shared between the runs.
+    """
+    _add_checks(interpreter, check_runs)
+
+
+def _add_checks(interpreter, owner):
+    """ Wrap loop_control and call_stack.push of the interpreter instance (see MethodHooks). """
+    interpreter.hooks.add(owner, interpreter, "loop_control", _limited_loop_control)
+    interpreter.hooks.add(owner, interpreter.call_stack, "push", _checked_push)
+
+
+def _checked_push(push):
+    def checked_push(ar):
+        check_current_run()
+        push(ar)
+
+    return checked_push
+
+
+def _limited_loop_control(loop_control):
+    """ Wrap the factory: its LoopControl checks the limits before each iteration. """
+
+    def limited_loop_control():
+        loop = loop_control()
+        count = loop._count
+
+        def checked_count():
+            check_current_run()
+            count()
+
+        loop._count = checked_count
+        return loop
+
+    return limited_loop_control
@@ -0,0 +1,148 @@
+""" Optimizations of the parsed trees (see Parser.optimize). """
+
+from .ast import (AST, BinOp, UnaryOp, Var, Attribute, Slicing, IfExpr, UnlessExpr, IfNotNullExpr, Number,
+                  Bool, NoneValue, Undefined, ValueAST, String, Bytes, Tuple, List, Set, Dict, Call, AwaitExpr,
+                  StarredTuple, StarredDict, Assign, SubexpressionScope, SharedSubexpression)
+
+# Expressions without side effects of their own: the only calls are the operators of the values.
+PURE_EXPRESSIONS = frozenset({BinOp, UnaryOp, Var, Attribute, Slicing, IfExpr, UnlessExpr, IfNotNullExpr, Number,
+                              Bool, NoneValue, Undefined, ValueAST, String, Bytes, Tuple, List, Set, Dict})
+EXPRESSIONS = PURE_EXPRESSIONS | {Call, AwaitExpr, StarredTuple, StarredDict}
+
+# Fields that are names or assignment targets, not evaluated expressions.
+TARGET_FIELDS = frozenset({"name", "type", "variable", "assigns", "assign", "token"})
+# The target of an Assign is its 'left' field (the left operand of a BinOp is an expression).
+ASSIGN_TARGET_FIELDS = TARGET_FIELDS | {"left"}
+
+
+def optimize(tree):
+    """ Apply the optimizations to a tree (in place) and return it. """
+    return CommonSubexpressionEliminator().statement(tree)
+
+
+def _map(function, value):
+    """ Apply a function to the nodes of a field: a node, or lists, tuples and dicts of nodes. """
+    if isinstance(value, AST):
+        return function(value)
+
+    elif isinstance(value, list):
+        return [_map(function, item) for item in value]
+
+    elif isinstance(value, tuple):
+        return tuple(_map(function, item) for item in value)
+
+    elif isinstance(value, dict):
+        return {key: _map(function, item) for key, item in value.items()}
+
+    return value
+
+
+def _map_fields(function, node, skip=()):
+    for name, value in vars(node).items():
+        if name not in skip:
+            setattr(node, name, _map(function, value))
+
+    return node
+
+
+def _target_fields(node):
+    return ASSIGN_TARGET_FIELDS if type(node) is Assign else TARGET_FIELDS
+
+
+def _index_key(node):
+    if type(node) is Number:
+        return "const", type(node.value), node.value
+
+    elif type(node) is String and node.parts is None and node.type != "path":
+        return "const", str, node.value
+
+    return _chain_key(node)
+
+
+def _chain_key(node):
+    """ Key of a chain of names, attributes and constant/name subscripts (a.b.c, a[0].b, a[i]), or None. """
+    node_type = type(node)
+    if node_type is Var:
+        return "var", node.value
+
+    elif node_type is Attribute:
+        key = _chain_key(node.value)
+        if key is not None:
+            return "attr", key, node.token.value
+
+    elif node_type is Slicing and len(node.slicing) == 1:
+        key = _chain_key(node.value)
+        index = _index_key(node.slicing[0])
+        if key is not None and index is not None:
+            return "item", key, index
+
+    return None
+
+
+class CommonSubexpressionEliminator():
+    """
+    Evaluate once the attribute chains repeated inside an expression: `cfg.a.b.c + cfg.a.b.d`.
+
+    Only the expressions without calls, awaits or assignments are optimized (the arguments of a call
+    are optimized on their own): nothing of the expression can change the repeated chains while it is
+    evaluated. The repeated chains are replaced by a SharedSubexpression, inside a SubexpressionScope
+    with the values of one evaluation. The interpreter keeps a value only when it is an attribute of
+    a space/module or of a special-attribute type, or an item of a builtin container.
+    """
+
+    def statement(self, node):
+        """ Optimize the expressions inside a statement (or any node that is not an expression). """
+        if type(node) in EXPRESSIONS:
+            return self.expression(node)
+
+        return _map_fields(self.statement, node, _target_fields(node))
+
+    def expression(self, node):
+        if not self.is_pure(node):
+            return _map_fields(self.statement, node, _target_fields(node))
+
+        counts = {}
+        self.count_chains(node, counts)
+        repeated = {key for key, count in counts.items() if count > 1}
+        if not repeated:
+            return node
+
+        shared = {}
+        return SubexpressionScope(self.share(node, repeated, shared), len(shared))
+
+    def is_pure(self, node):
+        if isinstance(node, AST):
+            return type(node) in PURE_EXPRESSIONS and all(self.is_pure(value) for value in vars(node).values())
+
+        elif isinstance(node, (list, tuple)):
+            return all(self.is_pure(item) for item in node)
+
+        return not isinstance(node, dict)
+
+    def count_chains(self, node, counts):
+        if isinstance(node, AST):
+            if type(node) in (Attribute, Slicing):
+                key = _chain_key(node)
+                if key is not None:
+                    counts[key] = counts.get(key, 0) + 1
+
+            for value in vars(node).values():
+                self.count_chains(value, counts)
+
+        elif isinstance(node, (list, tuple)):
+            for item in node:
+                self.count_chains(item, counts)
+
+    def share(self, node, repeated, shared):
+        """ Replace the repeated chains (the same node for all the occurrences of a chain). """
+        if type(node) in (Attribute, Slicing):
+            key = _chain_key(node)
+            if key in repeated:
+                subexpression = shared.get(key)
+                if subexpression is None:
+                    subexpression = shared[key] = SharedSubexpression(len(shared), node)
+                    _map_fields(lambda value: self.share(value, repeated, shared), node, ("token",))
+
+                return subexpression
+
+        return _map_fields(lambda value: self.share(value, repeated, shared), node, ("token",))
@@ -2,6 +2,7 @@
 
 from . import kandyerrors as kerr
 from .lexer import Lexer
+from .optimizer import optimize
 from .tokentype import TokenType, Token
 from .ast import (AST, Empty, BinOp, UnaryOp, StarredTuple, StarredDict, Assign,
                   Var, TypeVar, Slicing, Attribute, IfExpr, UnlessExpr, IfNotNullExpr, Compound,
@@ -11,19 +12,23 @@ from .ast import (AST, Empty, BinOp, UnaryOp, StarredTuple, StarredDict, Assign,
                   ForFromToStatement, ForCStatement, RepeatStatement, SwitchCaseStatement,
                   SwitchCaseItem, WhenCaseStatement, WhenCaseItem, WithStatement, TryStatement,
                   ExceptBlock, ImportStatement, UsingStatement, ClassStatement, LambdaDecl,
-                  DeleteStatement)
+                  DeleteStatement, AwaitExpr)
 
 
 # Parser
 class Parser():
     """ Parser-analyzer class: get tokens and convert it in AST nodes. """
 
-    def __init__(self, lexer: Lexer = None):
+    def __init__(self, lexer: Lexer = None, optimize=True):
         if lexer is None:
             lexer = Lexer()
 
         self.lexer = lexer
+        self.optimize = optimize  # Optimize the trees of the programs (see kandylib.optimizer).
         self.current_token = None
+        self._yield_found = False  # 'yield' found inside the current function block.
+        self._yield_allowed = False  # Inside the block of a 'def' function (not a procedure, lambda or class).
+        self._string_parser = None  # Parser of the expressions inside strings.
 
     def error(self, token, token_type):
         """ Raise error with tokens """
@@ -41,7 +46,12 @@ class Parser():
         """ Tokenize a program """
         self.lexer.load(text)
         self.current_token = self.lexer.get_next_token()
-        return self.program()
+        self._yield_found = self._yield_allowed = False
+        tree = self.program()
+        if self.optimize:
+            tree = optimize(tree)
+
+        return tree
 
     def parse_expr(self, text):
         """ Tokenize a expression """
@@ -49,6 +59,13 @@ class Parser():
         self.current_token = self.lexer.get_next_token()
         return self.expression()
 
+    def string_parser(self):
+        """ Parser for the string expressions, so the lexer of this one is not clobbered. """
+        if self._string_parser is None:
+            self._string_parser = Parser()
+
+        return self._string_parser
+
     def eat(self, token_type):
         """ Get the next token and validate the current. """
         # print((self.current_token, token_type))
@@ -181,7 +198,7 @@ class Parser():
             if self.peek()[0].type == TokenType.PROCEDURE:
                 return self.procedure_declaration()
 
-            elif self.peek()[0].type == TokenType.DEF:
+            elif self.peek()[0].type in (TokenType.DEF, TokenType.ASYNC):
                 return self.function_declaration()
 
             elif self.peek()[0].type == TokenType.LAMBDA:
@@ -190,7 +207,7 @@ class Parser():
         elif token.type == TokenType.PROCEDURE:
             return self.procedure_declaration()
 
-        elif token.type == TokenType.DEF:
+        elif token.type in (TokenType.DEF, TokenType.ASYNC):
             return self.function_declaration()
 
         elif token.type == TokenType.CLASS:
@@ -208,7 +225,7 @@ class Parser():
         elif token.type == TokenType.DO:
             return self.do_while_until_statement()
 
-        elif token.type in (TokenType.RETURN, TokenType.BREAK,
+        elif token.type in (TokenType.RETURN, TokenType.BREAK, TokenType.YIELD,
                             TokenType.CONTINUE, TokenType.EXPORT):
             return self.actions_statement()
 
@@ -273,12 +290,16 @@ class Parser():
         self.eat(TokenType.LPARENT)
         params = self.param_list_declaration()
         self.eat(TokenType.RPARENT)
+        yield_found, yield_allowed = self._yield_found, self._yield_allowed
+        self._yield_allowed = False
         if self.current_token.type == TokenType.COLON:
             self.eat(TokenType.COLON)
             block = self.statement(with_no_return=True)
         else:
             block = self.compound_statement(with_no_return=True)
 
+        self._yield_found, self._yield_allowed = yield_found, yield_allowed
+
         if local_type:
             return ProcedureDecl(variable, params, block, is_local=True)
 
@@ -287,7 +308,7 @@ class Parser():
 
     def function_declaration(self):
         """
-        function_declaration: (LOCAL)? DEF function_variable_declaration LPARENT
+        function_declaration: (LOCAL)? (ASYNC)? DEF function_variable_declaration LPARENT
                                param_list_declaration
                                RPARENT (COLON statement|arrow_statement|compound_statement)
         """
@@ -296,12 +317,19 @@ class Parser():
             self.eat(TokenType.LOCAL)
             local_type = True
 
+        async_type = False
+        if self.current_token.type == TokenType.ASYNC:
+            self.eat(TokenType.ASYNC)
+            async_type = True
+
         self.eat(TokenType.DEF)
         type_, variable = self.function_variable_declaration()
         self.eat(TokenType.LPARENT)
         params = self.param_list_declaration()
         self.eat(TokenType.RPARENT)
 
+        yield_found, yield_allowed = self._yield_found, self._yield_allowed
+        self._yield_found, self._yield_allowed = False, True
         if self.current_token.type == TokenType.COLON:
             self.eat(TokenType.COLON)
             block = self.statement()
@@ -312,11 +340,15 @@ class Parser():
         else:
             block = self.compound_statement()
 
+        generator_type = self._yield_found
+        self._yield_found, self._yield_allowed = yield_found, yield_allowed
+
         if local_type:
-            return FunctionDecl(variable, params, block, type_, is_local=True)
+            return FunctionDecl(variable, params, block, type_, is_local=True,
+                                is_async=async_type, is_generator=generator_type)
 
         else:
-            return FunctionDecl(variable, params, block, type_)
+            return FunctionDecl(variable, params, block, type_, is_async=async_type, is_generator=generator_type)
 
     def function_type(self):
         """
@@ -632,6 +664,7 @@ class Parser():
     def actions_statement(self):
         """
         actions_statement: RETURN (expression)
+                         | YIELD (expression)
                          | EXPORT
                          | CONTINUE ((COLON)? expression)?
                          | BREAK  ((COLON)? expression)?
@@ -643,6 +676,14 @@ class Parser():
             self.eat(TokenType.RETURN)
             expr = self.expression()
 
+        elif token.type == TokenType.YIELD:
+            if not self._yield_allowed:
+                self.error_syntax("The 'yield' statement can only be used inside a function.")
+
+            self.eat(TokenType.YIELD)
+            self._yield_found = True
+            expr = self.expression()
+
         elif token.type in (TokenType.CONTINUE, TokenType.BREAK):
             self.eat(token.type)
             if self.current_token.type == TokenType.COLON:
@@ -1129,7 +1170,7 @@ class Parser():
 
     def import_statement(self):
         """
-        import_statement: [PYTHON]? [FROM variable (COMMA variable)*] IMPORT module_names
+        import_statement: [PYTHON]? [FROM variable (COMMA variable)*] IMPORT [EXCLAMATION]? module_names
         """
         python_import = False
         package = None
@@ -1147,13 +1188,19 @@ class Parser():
 
         if self.current_token.type == TokenType.IMPORT:
             self.eat(TokenType.IMPORT)
+            # import! module: execute the module now, even in lazy-import mode.
+            eager = False
+            if self.current_token.type == TokenType.EXCLAMATION:
+                self.eat(TokenType.EXCLAMATION)
+                eager = True
+
             import_module = [self.module_names()]
 
             while self.current_token.type == TokenType.COMMA:
                 self.eat(TokenType.COMMA)
                 import_module.append(self.module_names())
 
-            return ImportStatement(import_module, package, python_import)
+            return ImportStatement(import_module, package, python_import, eager)
 
         else:
             self.error_syntax()
@@ -1206,7 +1253,10 @@ class Parser():
 
             self.eat(TokenType.RPARENT)
 
+            yield_allowed = self._yield_allowed
+            self._yield_allowed = False
             block = self.compound_statement(with_no_return=True)
+            self._yield_allowed = yield_allowed
 
             return ClassStatement(variable, objects, block)
 
@@ -1261,6 +1311,8 @@ class Parser():
             params = self.param_list_declaration()
             self.eat(TokenType.RPARENT)
 
+            yield_found, yield_allowed = self._yield_found, self._yield_allowed
+            self._yield_allowed = False
             if self.current_token.type == TokenType.COLON:
                 self.eat(TokenType.COLON)
                 block = self.statement()
@@ -1271,6 +1323,8 @@ class Parser():
             else:
                 block = self.compound_statement()
 
+            self._yield_found, self._yield_allowed = yield_found, yield_allowed
+
             if local_type:
                 return LambdaDecl(params, block, type_, is_local=True)
 
@@ -1531,19 +1585,31 @@ class Parser():
 
     def expr_pow(self):
         """
-        expr_pow -> expr_attr
-                  | expr_attr (POW expr_attr)
+        expr_pow -> expr_await
+                  | expr_await (POW expr_await)
         """
-        node = self.expr_attr()
+        node = self.expr_await()
 
         while self.current_token.type == TokenType.POW:
             token = self.current_token
             if token.type == TokenType.POW:
                 self.eat(token.type)
-                node = BinOp(left=node, op=token, right=self.expr_attr())
+                node = BinOp(left=node, op=token, right=self.expr_await())
 
         return node
 
+    def expr_await(self):
+        """
+        expr_await -> expr_attr
+                    | AWAIT expr_attr
+        """
+        token = self.current_token
+        if token.type == TokenType.AWAIT:
+            self.eat(TokenType.AWAIT)
+            return AwaitExpr(token, self.expr_attr())
+
+        return self.expr_attr()
+
     def expr_attr(self):
         """
         expr_attr: expr_value attributes
@@ -1669,11 +1735,11 @@ class Parser():
 
         elif token.type == (TokenType.STRING):
             self.eat(token.type)
-            return String(token)
+            return String(token, self.string_parser())
 
         elif token.type == (TokenType.BYTES):
             self.eat(token.type)
-            return Bytes(token)
+            return Bytes(token, self.string_parser())
 
         elif token.type == (TokenType.BOOL):
             self.eat(token.type)
@@ -0,0 +1,274 @@
+""" Profiler of KandyScript programs: functions, source lines and node types. """
+
+import sys
+import time
+import marshal
+import threading
+
+from .ast import AST, FunctionDecl, ProcedureDecl, LambdaDecl
+from .callstack import ARType
+from .actions import return_expression
+from .tokentype import Token
+
+
+class Profiler():
+    """
+    Execution profile of one or more interpreters (see Interpreter.enable_profiler).
+
+    functions: {(filename, lineno, name): [primitive calls, calls, self time, cumulative time, callers]}
+    lines: {(filename, lineno): [hits, self time]}
+    nodes: {node type: [visits, self time, cumulative time]}
+    stacks: {(function names): self time}, the collapsed stacks of the flamegraphs.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.functions = {}
+        self.lines = {}
+        self.nodes = {}
+        self.stacks = {}
+        self.stats = {}
+        self.__blocks = {}  # Body of the functions: key of the function.
+        self.__frames = []  # [children time, lineno] of the nodes being visited.
+        self.__calls = []  # [key, time in nested calls] of the functions being executed.
+        self.__active = {}  # Nested visits of each function and node type (recursion).
+
+    def add_tree(self, tree, filename):
+        """ Register the functions declared in a tree. """
+        nodes = [tree]
+        while nodes:
+            node = nodes.pop()
+            if isinstance(node, AST):
+                key = None
+                if isinstance(node, (FunctionDecl, ProcedureDecl)):
+                    token = node.name if isinstance(node.name, Token) else node.name.token
+                    key = (filename, token.lineno, token.value)
+
+                elif isinstance(node, LambdaDecl):
+                    key = (filename, 0, "<lambda>")
+
+                if key is not None:
+                    # '=> expression' bodies: the function visits the expression, not the block.
+                    for body in (node.block, return_expression(node.block)):
+                        if body is not None:
+                            self.__blocks[body] = key
+
+                nodes.extend(vars(node).values())
+
+            elif isinstance(node, (list, tuple)):
+                nodes.extend(node)
+
+    def wrappers(self, interpreter):
+        """ Return the (method name, wrapper) pairs of the profiled methods of an interpreter (see MethodHooks). """
+        return [("visit", lambda visit: self.attach(interpreter, visit))]
+
+    def attach(self, interpreter, visit):
+        """ Return the profiled version of a visit method of an interpreter. """
+        clock = self.clock
+        frames = self.__frames
+        blocks = self.__blocks
+        active = self.__active
+
+        def profiled_visit(node):
+            token = getattr(node, "token", None)
+            if isinstance(token, Token):
+                lineno = token.lineno
+            else:
+                lineno = frames[-1][1] if frames else 0
+
+            function = blocks.get(node)
+            if function is not None:
+                self._enter(function)
+
+            node_type = type(node).__name__
+            active[node_type] = active.get(node_type, 0) + 1
+            frames.append([0.0, lineno])
+            start = clock()
+            try:
+                return visit(node)
+
+            finally:
+                elapsed = clock() - start
+                children = frames.pop()[0]
+                if frames:
+                    frames[-1][0] += elapsed
+
+                active[node_type] -= 1
+                self._record(node_type, (interpreter.filename, lineno), elapsed - children, elapsed)
+                if function is not None:
+                    self._exit(function, elapsed)
+
+        return profiled_visit
+
+    def _record(self, node_type, line, self_time, elapsed):
+        active = self.__active
+        stat = self.nodes.get(node_type)
+        if stat is None:
+            stat = self.nodes[node_type] = [0, 0.0, 0.0]
+
+        stat[0] += 1
+        stat[1] += self_time
+        if not active.get(node_type):
+            stat[2] += elapsed
+
+        stat = self.lines.get(line)
+        if stat is None:
+            stat = self.lines[line] = [0, 0.0]
+
+        stat[0] += 1
+        stat[1] += self_time
+
+    def _enter(self, key):
+        self.__calls.append([key, 0.0])
+        self.__active[key] = self.__active.get(key, 0) + 1
+
+    def _exit(self, key, elapsed):
+        calls = self.__calls
+        self_time = elapsed - calls.pop()[1]
+        self.__active[key] -= 1
+        primitive = not self.__active[key]
+
+        if calls:
+            calls[-1][1] += elapsed
+            caller = calls[-1][0]
+        else:
+            caller = ("~", 0, "<module>")
+
+        stat = self.functions.get(key)
+        if stat is None:
+            stat = self.functions[key] = [0, 0, 0.0, 0.0, {}]
+
+        caller_stat = stat[4].setdefault(caller, [0, 0, 0.0, 0.0])
+        for values in (stat, caller_stat):
+            values[0] += primitive
+            values[1] += 1
+            values[2] += self_time
+            values[3] += elapsed if primitive else 0.0
+
+        stack = tuple(call[0][2] for call in calls) + (key[2],)
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + self_time
+
+    def clear(self):
+        self.functions.clear()
+        self.lines.clear()
+        self.nodes.clear()
+        self.stacks.clear()
+        self.stats.clear()
+
+    def report(self, limit=20):
+        """ Return a text report: functions, lines and node types sorted by self time. """
+        def top(stats, index):
+            return sorted(stats.items(), key=lambda item: item[1][index], reverse=True)[:limit]
+
+        output = ["Functions:", f"{'calls':>10} {'self (s)':>10} {'cumul. (s)':>10}  function"]
+        for (filename, lineno, name), stat in top(self.functions, 2):
+            calls = f"{stat[1]}" if stat[0] == stat[1] else f"{stat[1]}/{stat[0]}"
+            output.append(f"{calls:>10} {stat[2]:10.4f} {stat[3]:10.4f}  {name} ({filename}:{lineno})")
+
+        output.extend(["", "Lines:", f"{'hits':>10} {'self (s)':>10}  line"])
+        for (filename, lineno), stat in top(self.lines, 1):
+            output.append(f"{stat[0]:>10} {stat[1]:10.4f}  {filename}:{lineno}")
+
+        output.extend(["", "Nodes:", f"{'visits':>10} {'self (s)':>10} {'cumul. (s)':>10}  node"])
+        for node_type, stat in top(self.nodes, 1):
+            output.append(f"{stat[0]:>10} {stat[1]:10.4f} {stat[2]:10.4f}  {node_type}")
+
+        return "\n".join(output)
+
+    def create_stats(self):
+        """ Build the stats in the pstats format: pstats.Stats(profiler) works. """
+        self.stats = {
+            key: (stat[0], stat[1], stat[2], stat[3], {caller: tuple(values) for caller, values in stat[4].items()})
+            for key, stat in self.functions.items()
+        }
+
+    def dump_stats(self, filename):
+        """ Write the stats for pstats.Stats(filename), snakeviz, ... """
+        self.create_stats()
+        with open(filename, "wb") as f:
+            marshal.dump(self.stats, f)
+
+    def dump_collapsed(self, filename):
+        """ Write the collapsed stacks (microseconds of self time) for flamegraph.pl, speedscope, ... """
+        with open(filename, "w", encoding="utf-8") as f:
+            for stack, self_time in self.stacks.items():
+                f.write(f"{';'.join(stack)} {round(self_time * 1e6)}\n")
+
+
+class SamplingProfiler():
+    """
+    Statistical profiler: a background thread samples, every `interval` seconds, the KandyScript
+    stack of the thread running an interpreter. The interpreter itself is not instrumented.
+
+    A sample is the names of the function records of the CallStack and the line of the node being
+    visited (from the Python frames of the visitor), for example: ('main.ks', 'fib', 'fib', 'main.ks:3').
+    """
+
+    CALL_TYPES = (ARType.PROCEDURE, ARType.FUNCTION, ARType.CLASS)
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = {}  # stack: count
+        self.__thread_id = None
+        self.__thread = None
+        self.__stop = threading.Event()
+
+    @property
+    def running(self):
+        return self.__thread is not None
+
+    def start(self, thread_id=None):
+        """ Sample the stack of a thread (the current one by default) until stop(). """
+        self.__thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.__stop.clear()
+        self.__thread = threading.Thread(target=self.__run, name="KandySamplingProfiler", daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        if self.__thread is not None:
+            self.__stop.set()
+            self.__thread.join()
+            self.__thread = None
+
+        return self
+
+    def __run(self):
+        while not self.__stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """ Take one sample of the stack of the profiled thread. """
+        frame = sys._current_frames().get(self.__thread_id)
+        while frame is not None:
+            # The innermost visitor frame: Interpreter.visit_*(self, node) or Interpreter.visit.
+            node = frame.f_locals.get("node") if frame.f_code.co_name.startswith("visit") else None
+            if node is not None and isinstance(getattr(node, "token", None), Token):
+                interpreter = frame.f_locals.get("self")
+                break
+
+            frame = frame.f_back
+
+        else:
+            return
+
+        filename = getattr(interpreter, "filename", "<unknown>")
+        records = list(getattr(interpreter, "call_stack")._records) if hasattr(interpreter, "call_stack") else []
+        names = [record.name for record in records if record.type in self.CALL_TYPES]
+        stack = (filename, *names, f"{filename}:{node.token.lineno}")
+        self.samples[stack] = self.samples.get(stack, 0) + 1
+
+    def report(self, limit=20):
+        """ Return the most sampled stacks. """
+        total = sum(self.samples.values()) or 1
+        output = [f"{'samples':>10} {'%':>6}  stack"]
+        for stack, count in sorted(self.samples.items(), key=lambda item: item[1], reverse=True)[:limit]:
+            output.append(f"{count:>10} {count * 100 / total:6.1f}  {';'.join(stack)}")
+
+        return "\n".join(output)
+
+    def dump_collapsed(self, filename):
+        """ Write the collapsed stacks (sample counts) for flamegraph.pl, speedscope, ... """
+        with open(filename, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.items():
+                f.write(f"{';'.join(stack)} {count}\n")
@@ -100,9 +100,11 @@ class TokenType(Enum):
     CLASS = "class"
     PROCEDURE = "proc"
     DEF = "def"
+    ASYNC = "async"
+    AWAIT = "await"
     LAMBDA = "lambda"
     RETURN = "return"
-    # YIELD = "yield"  # Not Supported yet
+    YIELD = "yield"
     CONTINUE = "continue"
     BREAK = "break"
     DELETE = "del"
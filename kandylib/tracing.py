@@ -0,0 +1,282 @@
+""" Execution tracing: structured events of the interpreters, sent to pluggable sinks. """
+
+import sys
+import json
+import time
+import threading
+from collections import deque
+
+from .ast import AST, FunctionDecl, ProcedureDecl, LambdaDecl
+from .actions import return_expression
+from .tokentype import Token
+
+LOOP_VISITORS = ("visit_WhileStatement", "visit_UntilStatement", "visit_RepeatStatement",
+                 "visit_ForCStatement", "visit_ForFromToStatement", "visit_ForInStatement")
+LOOP_GENERATORS = tuple("generate_" + name[len("visit_"):] for name in LOOP_VISITORS)
+
+
+def node_lineno(node, depth=4):
+    """ Line of a node: its token, or the first token of its children. """
+    nodes = [node]
+    for _ in range(depth):
+        children = []
+        for item in nodes:
+            token = item if isinstance(item, Token) else getattr(item, "token", None)
+            if isinstance(token, Token):
+                return token.lineno
+
+            if isinstance(item, AST):
+                children.extend(vars(item).values())
+            elif isinstance(item, (list, tuple)):
+                children.extend(item)
+
+        nodes = children
+
+    return 0
+
+
+class Tracer():
+    """
+    Events of an interpreter (see Interpreter.subscribe), each one a dict sent to every sink:
+
+        function_enter / function_exit: name, duration (exit), error (exit)
+        loop_start / loop_finish: statement, count, finished, ignored, duration (finish)
+        import: modules, package, python, duration, error
+        exception: error, type
+
+    All the events have: event, time (perf_counter), thread, file and line.
+    The tracer wraps methods of the interpreter instance (see MethodHooks) only while it has sinks.
+    """
+
+    def __init__(self):
+        self.sinks = []
+        self.__blocks = {}  # Body of the functions: name of the function.
+        self.__started_loop = threading.local()  # .slot: list to keep the LoopControl of the loop starting.
+        self.__last_error = None
+        self.__attached = []  # Interpreters with the traced methods.
+
+    def subscribe(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def unsubscribe(self, sink):
+        self.sinks.remove(sink)
+
+    def emit(self, event, filename, line, **data):
+        data.update(event=event, time=time.perf_counter(), thread=threading.get_ident(), file=filename, line=line)
+        for sink in self.sinks:
+            sink(data)
+
+    def add_tree(self, tree):
+        """ Register the functions declared in a tree. """
+        nodes = [tree]
+        while nodes:
+            node = nodes.pop()
+            if isinstance(node, AST):
+                key = None
+                if isinstance(node, (FunctionDecl, ProcedureDecl)):
+                    token = node.name if isinstance(node.name, Token) else node.name.token
+                    key = token.value
+
+                elif isinstance(node, LambdaDecl):
+                    key = "<lambda>"
+
+                if key is not None:
+                    # '=> expression' bodies: the function visits the expression, not the block.
+                    for body in (node.block, return_expression(node.block)):
+                        if body is not None:
+                            self.__blocks[body] = key
+
+                nodes.extend(vars(node).values())
+
+            elif isinstance(node, (list, tuple)):
+                nodes.extend(node)
+
+    def attach(self, interpreter):
+        """ Wrap the traced methods of the interpreter instance. """
+        interpreter.tracer = self
+        for name, wrapper in self.wrappers(interpreter):
+            interpreter.hooks.add(self, interpreter, name, wrapper)
+
+        self.__attached.append(interpreter)
+        if interpreter.ast is not None:
+            self.add_tree(interpreter.ast)
+
+    def wrappers(self, interpreter):
+        """ Return the (method name, wrapper) pairs of the traced methods of an interpreter (see MethodHooks). """
+        wrappers = [
+            ("visit", lambda visit: self.__traced_visit(interpreter, visit)),
+            ("visit_ImportStatement", lambda visit_import: self.__traced_import(interpreter, visit_import)),
+            ("loop_control", self.__traced_loop_control),
+        ]
+        for name in LOOP_VISITORS:
+            wrappers.append((name, lambda visit_loop: self.__traced_loop(interpreter, visit_loop)))
+
+        for name in LOOP_GENERATORS:
+            wrappers.append((name, lambda generate_loop: self.__traced_generator(interpreter, generate_loop)))
+
+        return wrappers
+
+    def detach(self, interpreter=None):
+        """ Remove the wrappers of the interpreter instance (of all the attached ones by default). """
+        for interpreter in [interpreter] if interpreter is not None else list(self.__attached):
+            interpreter.tracer = None
+            interpreter.hooks.remove(self)
+            self.__attached.remove(interpreter)
+
+    def __error(self, interpreter, node, error):
+        if error is not self.__last_error:
+            self.__last_error = error
+            self.emit("exception", interpreter.filename, node_lineno(node),
+                      error=str(error), type=type(error).__name__)
+
+    def __traced_visit(self, interpreter, visit):
+        blocks = self.__blocks
+        clock = time.perf_counter
+
+        def traced_visit(node):
+            name = blocks.get(node)
+            if name is None:
+                try:
+                    return visit(node)
+
+                except Exception as e:
+                    self.__error(interpreter, node, e)
+                    raise
+
+            line = node_lineno(node)
+            self.emit("function_enter", interpreter.filename, line, name=name)
+            error = None
+            start = clock()
+            try:
+                return visit(node)
+
+            except Exception as e:
+                self.__error(interpreter, node, e)
+                error = repr(e)
+                raise
+
+            finally:
+                self.emit("function_exit", interpreter.filename, line, name=name,
+                          duration=clock() - start, error=error)
+
+        return traced_visit
+
+    def __loop_started(self, interpreter, node):
+        """ Emit loop_start, return the slot of the LoopControl (set by the first loop_control call). """
+        slot = [None]
+        self.__started_loop.slot = slot
+        self.emit("loop_start", interpreter.filename, node_lineno(node), statement=type(node).__name__)
+        return slot
+
+    def __loop_finished(self, interpreter, node, slot, duration):
+        loop = slot[0]
+        data = {}
+        if loop is not None:
+            data = dict(count=loop.get_count(), finished=loop.get_count_finished(), ignored=loop.get_ignored())
+
+        self.emit("loop_finish", interpreter.filename, node_lineno(node), statement=type(node).__name__,
+                  duration=duration, **data)
+
+    def __traced_loop(self, interpreter, visit_loop):
+        clock = time.perf_counter
+
+        def traced_loop(node):
+            slot = self.__loop_started(interpreter, node)
+            start = clock()
+            try:
+                return visit_loop(node)
+
+            finally:
+                self.__loop_finished(interpreter, node, slot, clock() - start)
+
+        return traced_loop
+
+    def __traced_generator(self, interpreter, generate_loop):
+        """ Loops of the generator functions: loop_finish is sent when the loop ends or the generator is closed. """
+        clock = time.perf_counter
+
+        def traced_generator(node):
+            slot = self.__loop_started(interpreter, node)
+            start = clock()
+            try:
+                return (yield from generate_loop(node))
+
+            finally:
+                self.__loop_finished(interpreter, node, slot, clock() - start)
+
+        return traced_generator
+
+    def __traced_loop_control(self, loop_control):
+        started_loop = self.__started_loop
+
+        def traced_loop_control():
+            loop = loop_control()
+            # The loop statements create their LoopControl before running any other code.
+            slot = getattr(started_loop, "slot", None)
+            if slot is not None:
+                slot[0] = loop
+                started_loop.slot = None
+
+            return loop
+
+        return traced_loop_control
+
+    def __traced_import(self, interpreter, visit_import):
+        clock = time.perf_counter
+
+        def traced_import(node):
+            modules = [module[0].value for module in node.module_names]
+            package = ".".join(module.value for module in node.package) if node.package is not None else None
+            error = None
+            start = clock()
+            try:
+                return visit_import(node)
+
+            except Exception as e:
+                error = repr(e)
+                raise
+
+            finally:
+                self.emit("import", interpreter.filename, node_lineno(node), modules=modules, package=package,
+                          python=node.is_python_file, duration=clock() - start, error=error)
+
+        return traced_import
+
+
+class RingBufferSink():
+    """ Keep the last `capacity` events in memory. """
+
+    def __init__(self, capacity=10000):
+        self.buffer = deque(maxlen=capacity)
+
+    def __call__(self, event):
+        self.buffer.append(event)
+
+    def events(self, event=None):
+        """ Return the events kept (only of a type, if given). """
+        return [item for item in self.buffer if event is None or item["event"] == event]
+
+    def clear(self):
+        self.buffer.clear()
+
+
+class JsonLinesSink():
+    """ Write each event as a JSON line to a file (a path or an open text file). """
+
+    def __init__(self, file=sys.stderr, flush=False):
+        self.__close = isinstance(file, str)
+        self.file = open(file, "a", encoding="utf-8") if self.__close else file
+        self.flush = flush
+        self.__lock = threading.Lock()
+
+    def __call__(self, event):
+        line = json.dumps(event, default=repr)
+        with self.__lock:
+            self.file.write(line + "\n")
+            if self.flush:
+                self.file.flush()
+
+    def close(self):
+        if self.__close:
+            self.file.close()
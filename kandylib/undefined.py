@@ -18,5 +18,9 @@ class UndefinedType:
     def __eq__(self, other):
         return isinstance(other, UndefinedType)
 
+    def __reduce__(self):
+        # Unpickle as the singleton: parsed trees can come from other processes.
+        return "UNDEFINED_TYPE"
+
 
 UNDEFINED_TYPE = UndefinedType()
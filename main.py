@@ -2,6 +2,12 @@
 from enum import Enum
 import os
 import sys
+import asyncio
+import inspect
+import threading
+import functools
+import mmap
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 # Used by kandy:
 import pathlib
@@ -9,20 +15,28 @@ import time
 import math
 import random
 import _io
-import importlib
 import builtins
 
 # kandymodules
 from kandylib import kandyerrors as kerr
-from kandylib.tokentype import TokenType, Token, RESERVED_KEYWORDS
+from kandylib.tokentype import TokenType, RESERVED_KEYWORDS
 from kandylib.parser import Parser
 from kandylib.lexer import Lexer
 from kandylib.undefined import UNDEFINED_TYPE
 from kandylib.kandyclass import create_class_items
-from kandylib.kandydefault import KandyInt, KandyFloat, KandyStr, KandyList, KandyTuple, KandyDict
+from kandylib.kandydefault import (KandyInt, KandyFloat, KandyStr, KandyList, KandyTuple, KandyDict,
+                                   KandyMappedFile, EmptyMappedFile, mapfile, bind_special_attribute,
+                                   special_dir)
 from kandylib.actions import (ProcedureCall, FunctionCall, ModuleClass, SpaceClass, CurrentSpaceClass,
                               PrevSpaceClass, PrivateSpaceClass, Spaces, MultipleTypesClass, Numeric,
-                              LoopControl, take_splitter)
+                              LoopControl, ControlFlow, ReturnSignal, BreakSignal, ContinueSignal,
+                              KandyCoroutine, gather, take_splitter, module_registry,
+                              module_index, python_import)
+from kandylib.profiler import Profiler, SamplingProfiler
+from kandylib.tracing import Tracer, JsonLinesSink
+from kandylib.limits import ResourceLimits, CancellationToken
+from kandylib.hooks import MethodHooks, RunHooks
+from kandylib.archive import ARCHIVE_MAIN, ARCHIVE_LIBRARY, open_archive, find_archive, write_archive
 from kandylib.callstack import CallStack, ARType, ActivationRecord, Record, RecordConstant, ClassObjectWithARC
 from kandylib.ast import (AST, Empty, ValueAST, BinOp, UnaryOp, StarredTuple, StarredDict, Assign,
                           Var, TypeVar, Slicing, Attribute, IfExpr, UnlessExpr, IfNotNullExpr, Compound,
@@ -30,12 +44,18 @@ from kandylib.ast import (AST, Empty, ValueAST, BinOp, UnaryOp, StarredTuple, St
                           Undefined, String, Bytes, Tuple, List, Set, Dict, ProcedureDecl, FunctionDecl,
                           Param, Call, ScriptAction, WhileStatement, UntilStatement, ForInStatement,
                           ForFromToStatement, ForCStatement, RepeatStatement, SwitchCaseStatement,
-                          SwitchCaseItem, WhenCaseStatement, WhenCaseItem, WithStatement, TryStatement,
-                          ImportStatement, UsingStatement, ClassStatement, LambdaDecl, DeleteStatement)
+                          WhenCaseStatement, WithStatement, TryStatement,
+                          ImportStatement, UsingStatement, ClassStatement, LambdaDecl, DeleteStatement,
+                          AwaitExpr, SubexpressionScope, SharedSubexpression)
+from kandylib.ast import CASE_TABLE_TYPES
 
 KANDY_DIRECTORY = os.path.dirname(__file__)
-KANDY_LIBRARY_DIRECTORY = f"{KANDY_DIRECTORY}\\lib"
-KANDY_LIBRARY_DIRECTORY_PYTHON = f"{KANDY_DIRECTORY}\\lib_py"
+KANDY_LIBRARY_DIRECTORY = os.path.join(KANDY_DIRECTORY, "lib")
+KANDY_LIBRARY_DIRECTORY_PYTHON = os.path.join(KANDY_DIRECTORY, "lib_py")
+# Search path of the .ks modules (after the directory of the importer): KANDYPATH, then the library.
+KANDY_PATH = [path for path in os.environ.get("KANDYPATH", "").split(os.pathsep) if path]
+KANDY_PATH.append(KANDY_LIBRARY_DIRECTORY)
+KANDY_MMAP_SOURCE_SIZE = 1 << 20  # Sources bigger than this are decoded from a memory map.
 
 if not os.path.exists(KANDY_LIBRARY_DIRECTORY):
     os.makedirs(KANDY_LIBRARY_DIRECTORY)
@@ -70,7 +90,10 @@ class NodeVisitor():
 class Interpreter(NodeVisitor):
     """ KandyInterpreter Class """
 
-    def __init__(self, parser: Parser = None, log_stack=False, print_call_stack=False):
+    loop_control = LoopControl  # Factory of the LoopControl of the loop statements (see Tracer).
+    CONTROL_SIGNALS = {TokenType.RETURN: ReturnSignal, TokenType.BREAK: BreakSignal, TokenType.CONTINUE: ContinueSignal}
+
+    def __init__(self, parser: Parser = None, log_stack=False, print_call_stack=False, lazy_imports=False):
         if parser is None:
             parser = Parser()
 
@@ -88,7 +111,16 @@ class Interpreter(NodeVisitor):
         # Interpreter control:
         self._inside_class = None
 
+        # Async: only the thread holding the baton runs KandyScript code.
+        self.event_loop = None
+        self.max_async_tasks = 512
+        self._task_executor = None
+        self._baton = threading.Lock()
+        self._baton_owner = None
+
         # Kandy Import
+        self.lazy_imports = lazy_imports  # Execute .ks modules on first use ('import!' is always eager).
+        self.preload_imports = False  # Parse the imported .ks modules in parallel before interpreting.
         self.modules_imported = {}
         self.modules = {}
 
@@ -100,11 +132,27 @@ class Interpreter(NodeVisitor):
             int: KandyInt,
             float: KandyFloat,
             str: KandyStr,
-            # list: KandyList,
+            list: KandyList,
             dict: KandyDict,
             tuple: KandyTuple,
+            mmap.mmap: KandyMappedFile,
+            EmptyMappedFile: KandyMappedFile,
         }
 
+        # Wrappers of the methods of this instance (profiler, tracer and limits), see MethodHooks.
+        self.hooks = MethodHooks()
+        # Profiler (see enable_profiler): None = disabled, with no overhead.
+        self.profiler = None
+        # Sampling profiler: seconds between samples of the running scripts (None = disabled).
+        self.sampling_interval = None
+        self.sampler = None
+        # Execution tracing (see subscribe): None = no subscribers, with no overhead.
+        self.tracer = None
+        # Resource limits of each run (see set_limits): None = unlimited, with no overhead.
+        self.limits = None
+        # Values of the SharedSubexpressions of the SubexpressionScope being evaluated.
+        self._subexpressions = None
+
         # Log
         self.log_stack = log_stack
         self.print_call_stack = print_call_stack
@@ -205,12 +253,15 @@ class Interpreter(NodeVisitor):
         for pc in python_functions:
             ar0[pc.__name__] = RecordConstant(pc)
 
-        python_default_modules = [pathlib, time, os, math, random]
+        python_default_modules = [pathlib, time, os, math, random, asyncio]
         for pc in python_default_modules:
             ar0[pc.__name__] = RecordConstant(pc)
 
         # Modify functions:
         ar0['dir'] = RecordConstant(self.dir)
+        ar0['gather'] = RecordConstant(gather)
+        ar0['mapfile'] = RecordConstant(mapfile)
+        ar0['reload'] = RecordConstant(self.reload_module)
 
         # Special clases:
         ar0['MultipleTypesClass'] = RecordConstant(MultipleTypesClass)
@@ -276,7 +327,7 @@ class Interpreter(NodeVisitor):
     def get_ar_from_object(self, obj):
         """ Get the AR from Space objects. """
         if isinstance(obj, ModuleClass):
-            value = self.modules[obj]
+            value = self.modules[obj._load()]
             if isinstance(value, ActivationRecord):
                 return value
 
@@ -521,8 +572,7 @@ class Interpreter(NodeVisitor):
     def get_special_attribute(self, obj, value):
         class_ = self.special_attributes.get(type(obj))
         if class_ is not None:
-            item = class_(obj)
-            return getattr(item, value)
+            return bind_special_attribute(class_, obj, value)
 
         else:
             class_ = self.special_attributes.get(obj)
@@ -535,11 +585,66 @@ class Interpreter(NodeVisitor):
     def is_inside_class(self):
         return (self._inside_class is not None)
 
+    # Async:
+    def _acquire_baton(self):
+        self._baton.acquire()
+        self._baton_owner = threading.get_ident()
+
+    def _release_baton(self):
+        if self._baton_owner == threading.get_ident():
+            self._baton_owner = None
+            self._baton.release()
+
+    async def _run_awaitable(self, awaitable):
+        self.event_loop = asyncio.get_running_loop()
+        try:
+            return await awaitable
+        finally:
+            self.event_loop = None
+
+    def _await(self, awaitable):
+        """ Wait for a python awaitable, letting other KandyCoroutine-tasks run meanwhile. """
+        loop = self.event_loop
+        records = self.call_stack.detach()
+        self._release_baton()
+        try:
+            if loop is not None and loop.is_running():
+                future = asyncio.run_coroutine_threadsafe(_as_coroutine(awaitable), loop)
+                return future.result()
+
+            return asyncio.run(self._run_awaitable(awaitable))
+
+        finally:
+            self._acquire_baton()
+            self.call_stack.attach(records)
+
+    def get_task_executor(self):
+        """ Threads used by KandyCoroutine-tasks (they wait for the baton while blocked). """
+        if self._task_executor is None:
+            self._task_executor = ThreadPoolExecutor(
+                max_workers=self.max_async_tasks,
+                thread_name_prefix="KandyTask"
+            )
+
+        return self._task_executor
+
+    def run_task(self, function, records):
+        """ Run a KandyCoroutine body from an executor thread with its own records. """
+        self._acquire_baton()
+        saved = self.call_stack.detach()
+        self.call_stack.attach(records)
+        try:
+            return function()
+
+        finally:
+            self.call_stack.attach(saved)
+            self._release_baton()
+
     # Functions:
     def dir(self, obj):
         if type(obj) in self.special_attributes:
             class_ = self.special_attributes.get(type(obj))
-            return dir(class_(obj))
+            return special_dir(class_, obj)
 
         elif obj in self.special_attributes:
             return dir(self.special_attributes.get(obj))
@@ -550,34 +655,36 @@ class Interpreter(NodeVisitor):
     # Visitors:
     # Blocks:
     def visit_Compound(self, node: Compound):
-        """ Visit all children inside the parent node. """
-        for child in node.children:
-            # print(type(child).__name__,self.visit(child))
-            result = self.visit(child)
-            if isinstance(result, ScriptAction):
-                if result.action == "return":
-                    if node.return_action:
-                        return result
+        """
+        Visit all children inside the parent node. A 'return' ends the block with its value,
+        unless the block propagates the action (return_action: the blocks of the statements).
+        """
+        visit = self.visit
+        if node.return_action:
+            for child in node.children:
+                visit(child)
 
-                    return (result.data)
+            return None
 
-                elif result.action in ("continue", "break"):
-                    return result
+        try:
+            for child in node.children:
+                visit(child)
 
-                else:
-                    self._invalid_script_action()
+        except ReturnSignal as action:
+            return action.data
 
     def visit_CompoundWithNoReturn(self, node: CompoundWithNoReturn):
         """ Visit all children inside the parent node. """
-        for child in node.children:
-            # print(type(child).__name__,self.visit(child))
-            result = self.visit(child)
-            if isinstance(result, ScriptAction):
-                if result.action == "return":
-                    raise SyntaxError("The 'return' statement can't be used here.")
+        visit = self.visit
+        try:
+            for child in node.children:
+                visit(child)
 
-                else:
-                    self._invalid_script_action()
+        except ReturnSignal:
+            raise SyntaxError("The 'return' statement can't be used here.")
+
+        except ControlFlow:
+            self._invalid_script_action()
 
     # Operations
     def visit_Assign(self, node: Assign):
@@ -711,32 +818,23 @@ class Interpreter(NodeVisitor):
         return node.value
 
     def visit_ScriptAction(self, node: ScriptAction):
-        """ ScriptActions like 'RETURN', 'CONTINUE', 'BREAK', 'EXPORT', etc. """
-        if node.token.type == TokenType.EXPORT:
-            ar = self.call_stack.peek()
-            expr = ValueAST(
-                SpaceClass(
-                    interpreter=self, ar=ar, name=f"Space-Exported-{ar.name}"
-                )
-            )
-            token = Token(
-                TokenType.RETURN,
-                "return",
-                pos=node.token.pos,
-                column=node.token.column,
-                lineno=node.token.lineno
-            )
+        """ ScriptActions like 'RETURN', 'CONTINUE', 'BREAK', 'EXPORT', etc.: raise their signal. """
+        signal = self.CONTROL_SIGNALS.get(node.token.type)
+        if signal is not None:
+            data = None
+            if isinstance(node.expression, AST):
+                data = self.visit(node.expression)
 
-            return ScriptAction(token=token, expression=expr)
+            raise signal(data)
 
-        elif node.token.type in (TokenType.RETURN, TokenType.CONTINUE, TokenType.BREAK):
-            if isinstance(node.expression, AST):
-                node.data = self.visit(node.expression)
+        elif node.token.type == TokenType.EXPORT:
+            ar = self.call_stack.peek()
+            raise ReturnSignal(SpaceClass(interpreter=self, ar=ar, name=f"Space-Exported-{ar.name}"))
 
-                if isinstance(node.data, ScriptAction):
-                    raise SyntaxError("Invalid {node.token.value} statement.")
+        elif node.token.type == TokenType.YIELD:
+            raise SyntaxError("The 'yield' statement can't be used here.")
 
-        return node
+        self._invalid_script_action()
 
     # Data:
     def visit_Empty(self, _: Empty):
@@ -751,40 +849,29 @@ class Interpreter(NodeVisitor):
         """ Return the bool value (True/False). """
         return node.value
 
+    def render_string(self, node: String):
+        """ Join the literal parts and the rendered expressions of a string. """
+        visit = self.visit
+        return "".join([part if part.__class__ is str else part[1](visit(part[0])) for part in node.parts])
+
     def visit_String(self, node: String):
         """ Return the content of the string class. """
-        if node.type == "path":
-            if len(node.expr) >= 1:
-                content = node.content
-                path = content.format(**node.evaluate_expressions(self))
-            else:
-                path = node.content
+        if node.parts is None:
+            return node.value
 
-            return pathlib.Path(path)
+        elif node.type == "path":
+            return pathlib.Path(self.render_string(node))
 
-        elif len(node.expr) >= 1:
-            content = node.content
-            return content.format(**node.evaluate_expressions(self))
-        else:
-            return node.content
+        return self.render_string(node)
 
     def visit_Bytes(self, node: Bytes):
         """ Return the content of the bytes class. """
-        if node.type == "path":
-            if len(node.expr) >= 1:
-                content = node.content
-                path = content.format(**node.evaluate_expressions(self))
-            else:
-                path = node.content
+        if node.parts is None:
+            return node.value
 
-            return pathlib.Path(path.encode())
-
-        elif len(node.expr) >= 1:
-            content = node.content
-            return content.format(**node.evaluate_expressions(self)).encode()
-
-        else:
-            return node.content.encode()
+        visit = self.visit
+        return b"".join([part if part.__class__ is bytes else part[1](visit(part[0])).encode()
+                         for part in node.parts])
 
     def visit_NoneValue(self, _: NoneValue):
         """ Return the null value. """
@@ -843,6 +930,18 @@ class Interpreter(NodeVisitor):
         elif node.on_false is not None:
             return self.visit(node.on_false)
 
+    def visit_AwaitExpr(self, node: AwaitExpr):
+        """ Wait for a coroutine/awaitable and return its result. """
+        value = self.visit(node.value)
+        if isinstance(value, KandyCoroutine):
+            return value.run()
+
+        elif inspect.isawaitable(value):
+            return self._await(value)
+
+        message = f"object {type(value).__name__} can't be used in 'await' expression"
+        raise TypeError(message)
+
     def visit_Attribute(self, node: Attribute):
         obj = self.visit(node.value)
         if isinstance(obj, Record):
@@ -872,6 +971,52 @@ class Interpreter(NodeVisitor):
             index1 = node.slicing[0]
             return self.visit(node.value)[self.visit(index1)]
 
+    # Builtin containers: the items of a SharedSubexpression are kept for the whole SubexpressionScope.
+    SHARED_ITEM_TYPES = frozenset({tuple, list, dict, str, bytes})
+
+    def visit_SubexpressionScope(self, node: SubexpressionScope):
+        previous = self._subexpressions
+        self._subexpressions = [None] * node.count
+        try:
+            return self.visit(node.expression)
+
+        finally:
+            self._subexpressions = previous
+
+    def visit_SharedSubexpression(self, node: SharedSubexpression):
+        """
+        Value of an attribute/item repeated in the expression: evaluated once if it is an attribute of a
+        space or of a special-attribute type, or an item of a builtin container (other objects can
+        compute a new value on each access).
+        """
+        values = self._subexpressions
+        value = values[node.index]
+        if value is not None:
+            return value
+
+        expression = node.expression
+        obj = self.visit(expression.value)
+        if isinstance(expression, Slicing):
+            value = obj[self.visit(expression.slicing[0])]
+            if type(obj) not in self.SHARED_ITEM_TYPES:
+                return value
+
+        else:
+            if isinstance(obj, Record):
+                obj = obj.value
+
+            if isinstance(obj, Spaces):
+                value = self.load_variable_from(name=expression.token.value, ar=self.get_ar_from_object(obj))
+
+            elif (type(obj) in self.special_attributes) or ((type(obj) == type) and obj in self.special_attributes):
+                value = self.get_special_attribute(obj, expression.token.value)
+
+            else:
+                return getattr(obj, expression.token.value)
+
+        values[node.index] = value
+        return value
+
     def visit_Call(self, node: Call):
         """ Call a function/procedure. """
         function = self.visit(node.value)
@@ -958,7 +1103,7 @@ class Interpreter(NodeVisitor):
         self.assign(
             name=name,
             value=FunctionCall(
-                self, name, block, params, type_return, strict, is_local
+                self, name, block, params, type_return, strict, is_local, node.is_async, node.is_generator
             ),
             var_type=None
         )
@@ -1004,174 +1149,83 @@ class Interpreter(NodeVisitor):
         if node.else_statement is not None:
             return self.visit(node.else_statement)
 
+    # Loops: the iterations of each statement are defined once (the _iterate_ generators: conditions,
+    # increments, ...), and run by _visit_loop or _generate_loop (LoopControl, break/continue, else).
     def visit_WhileStatement(self, node: WhileStatement):
-        """ Execute a while statement. """
-        name = None
-        loop = LoopControl()
-        if node.variable is not None:
-            name = self.general_assign(value=loop, var_ast=node.variable, var_type=None)
-
-        if node.do_first:
-            loop._count()
-            result = self.visit(node.block)
-            if isinstance(result, ScriptAction):
-                if result.action == "continue":
-                    if result.data is None or result.data == loop or self.visit(result.data) == loop:
-                        pass
-                    else:
-                        loop._finish()
-                        return result
-
-                elif result.action == "break":
-                    if result.data is None or result.data == loop or self.visit(result.data) == name:
-                        loop._finish()
-                        return None
-                    else:
-                        loop._finish()
-                        return result
-
-                elif result.action == "return":
-                    loop._finish()
-                    return result
-
-            loop._count_finished()
-
-        while self.visit(node.condition):
-            loop._count()
-            if loop.get_remaining_ignore_count():
-                loop._ignore()
-                loop._count_finished()
-                continue
-
-            result = self.visit(node.block)
-            if isinstance(result, ScriptAction):
-                if result.action == "continue":
-                    if result.data is None or result.data == loop or self.visit(result.data) == loop:
-                        continue
-                    else:
-                        loop._finish()
-                        return result
+        """ Execute a while (or until) statement. """
+        return self._visit_loop(node, self._iterate_while(node))
 
-                elif result.action == "break":
-                    if result.data is None or result.data == loop or self.visit(result.data) == name:
-                        loop._finish()
-                        return None
-                    else:
-                        loop._finish()
-                        return result
+    def visit_UntilStatement(self, node: UntilStatement):
+        """ Execute an until (while not) statement. """
+        return self._visit_loop(node, self._iterate_while(node))
 
-                elif result.action == "return":
-                    loop._finish()
-                    return result
+    def visit_RepeatStatement(self, node: RepeatStatement):
+        """ Execute a repeat statement. """
+        return self._visit_loop(node, self._iterate_repeat(node))
 
-            loop._count_finished()
+    def visit_ForCStatement(self, node: ForCStatement):
+        """ Execute a for-c statement. """
+        return self._visit_loop(node, self._iterate_for_c(node))
 
-        loop._finish()
+    def visit_ForFromToStatement(self, node: ForFromToStatement):
+        """ Execute a for-from-to statement. """
+        return self._visit_loop(node, self._iterate_for_from_to(node), self._assign_for_from_to)
 
-        if node.else_statement is not None:
-            self.visit(node.else_statement)
+    def visit_ForInStatement(self, node: ForInStatement):
+        """ Execute a for-in statement. """
+        return self._visit_loop(node, self._iterate_for_in(node), self._assign_for_in)
 
-    def visit_UntilStatement(self, node: UntilStatement):
-        """ Execute an until (while not) statement. """
+    def _start_loop(self, node):
+        """ Return the LoopControl of a loop statement and its name ('as name'), or None. """
         name = None
-        loop = LoopControl()
+        loop = self.loop_control()
         if node.variable is not None:
             name = self.general_assign(value=loop, var_ast=node.variable, var_type=None)
 
-        if node.do_first:
-            loop._count()
-            result = self.visit(node.block)
-            if isinstance(result, ScriptAction):
-                if result.action == "continue":
-                    if result.data is None or result.data == loop or self.visit(result.data) == loop:
-                        pass
-                    else:
-                        loop._finish()
-                        return result
-
-                elif result.action == "break":
-                    if result.data is None or result.data == loop or self.visit(result.data) == name:
-                        loop._finish()
-                        return None
-                    else:
-                        loop._finish()
-                        return result
-
-                elif result.action == "return":
-                    loop._finish()
-                    return result
+        return loop, name
 
+    def _skip_iteration(self, loop):
+        """ Count an iteration: True if it is ignored (LoopControl.ignore). """
+        loop._count()
+        if loop.get_remaining_ignore_count():
+            loop._ignore()
             loop._count_finished()
+            return True
 
-        while not self.visit(node.condition):
-            loop._count()
-            if loop.get_remaining_ignore_count():
-                loop._ignore()
-                loop._count_finished()
-                continue
-
-            result = self.visit(node.block)
-            if isinstance(result, ScriptAction):
-                if result.action == "continue":
-                    if result.data is None or result.data == loop or self.visit(result.data) == loop:
-                        continue
-                    else:
-                        loop._finish()
-                        return result
-
-                elif result.action == "break":
-                    if result.data is None or result.data == loop or self.visit(result.data) == name:
-                        return None
-                    else:
-                        loop._finish()
-                        return result
-
-                elif result.action == "return":
-                    loop._finish()
-                    return result
+        return False
 
-            loop._count_finished()
+    def _loop_signal(self, action, loop, name):
+        """
+        Handle a break/continue/return raised by the block of a loop: return True for the next
+        iteration, False to end the loop (break), or re-raise it if it is for an outer statement.
+        """
+        if action.__class__ is ContinueSignal and self._is_loop_target(action, loop, name):
+            return True
 
         loop._finish()
+        if action.__class__ is BreakSignal and self._is_loop_target(action, loop, name):
+            return False
 
-        if node.else_statement is not None:
-            self.visit(node.else_statement)
-
-    def visit_RepeatStatement(self, node: RepeatStatement):
-        """ Execute a repeat statement. """
-        name = None
-        loop = LoopControl()
-        if node.variable is not None:
-            name = self.general_assign(value=loop, var_ast=node.variable, var_type=None)
+        raise action
 
-        value = self.visit(node.value)
-        for _ in range(value):
-            loop._count()
-            if loop.get_remaining_ignore_count():
-                loop._ignore()
-                loop._count_finished()
+    def _visit_loop(self, node, iterations, assign=None):
+        """ Run the block of a loop statement for each iteration, then the else statement. """
+        loop, name = self._start_loop(node)
+        for value in iterations:
+            if self._skip_iteration(loop):
                 continue
 
-            result = self.visit(node.block)
-            if isinstance(result, ScriptAction):
-                if result.action == "continue":
-                    if result.data is None or result.data == loop or self.visit(result.data) == loop:
-                        continue
-                    else:
-                        loop._finish()
-                        return result
+            if assign is not None:
+                assign(node, value)
 
-                elif result.action == "break":
-                    if result.data is None or result.data == loop or self.visit(result.data) == name:
-                        loop._finish()
-                        return None
-                    else:
-                        loop._finish()
-                        return result
+            try:
+                self.visit(node.block)
 
-                elif result.action == "return":
-                    loop._finish()
-                    return result
+            except ControlFlow as action:
+                if self._loop_signal(action, loop, name):
+                    continue
+
+                return None
 
             loop._count_finished()
 
@@ -1180,237 +1234,156 @@ class Interpreter(NodeVisitor):
         if node.else_statement is not None:
             self.visit(node.else_statement)
 
-    def visit_ForCStatement(self, node: ForCStatement):
-        """ Execute a for-c statement. """
-        name = None
-        loop = LoopControl()
-        if node.variable is not None:
-            name = self.general_assign(value=loop, var_ast=node.variable, var_type=None)
-
-        self.visit(node.assign)
-        while self.visit(node.condition):
-            loop._count()
-            if loop.get_remaining_ignore_count():
-                loop._ignore()
-                loop._count_finished()
-                continue
-
-            result = self.visit(node.block)
-            if isinstance(result, ScriptAction):
-                if result.action == "continue":
-                    if result.data is None or result.data == loop or self.visit(result.data) == loop:
-                        continue
-                    else:
-                        loop._finish()
-                        return result
+    def _iterate_while(self, node):
+        expected = not isinstance(node, UntilStatement)
+        if node.do_first:
+            yield None
 
-                elif result.action == "break":
-                    if result.data is None or result.data == loop or self.visit(result.data) == name:
-                        loop._finish()
-                        return None
-                    else:
-                        loop._finish()
-                        return result
+        while bool(self.visit(node.condition)) == expected:
+            yield None
 
-                elif result.action == "return":
-                    loop._finish()
-                    return result
+    def _iterate_repeat(self, node):
+        yield from range(self.visit(node.value))
 
-            loop._count_finished()
+    def _iterate_for_c(self, node):
+        # The increment runs after every iteration: finished, ignored or continued (not after a break).
+        self.visit(node.assign)
+        while self.visit(node.condition):
+            yield None
             self.visit(node.increment)
 
-        loop._finish()
-
-        if node.else_statement is not None:
-            self.visit(node.else_statement)
-
-    def visit_ForFromToStatement(self, node: ForFromToStatement):
-        """ Execute a for-from-to statement. """
-        name = None
-        loop = LoopControl()
-        if node.variable is not None:
-            name = self.general_assign(value=loop, var_ast=node.variable, var_type=None)
-
+    def _iterate_for_from_to(self, node):
         start = self.visit(node.value_start)
         end = self.visit(node.value_end)
         step = (1 if end > start else -1)
+        yield from range(start, end+step, step)
 
-        for current in range(start, end+step, step):
-            loop._count()
-            if loop.get_remaining_ignore_count():
-                loop._ignore()
-                loop._count_finished()
-                continue
-
-            self.general_assign(value=current, var_ast=node.assign, var_type=None)
-            result = self.visit(node.block)
-            if isinstance(result, ScriptAction):
-                if result.action == "continue":
-                    if result.data is None or result.data == loop or self.visit(result.data) == loop:
-                        continue
-                    else:
-                        loop._finish()
-                        return result
-
-                elif result.action == "break":
-                    if result.data is None or result.data == loop or self.visit(result.data) == name:
-                        loop._finish()
-                        return None
-                    else:
-                        loop._finish()
-                        return result
-
-                elif result.action == "return":
-                    loop._finish()
-                    return result
-
-            loop._count_finished()
-
-        loop._finish()
-
-        if node.else_statement is not None:
-            self.visit(node.else_statement)
-
-    def visit_ForInStatement(self, node: ForInStatement):
-        """ Execute a for-in statement. """
-        name = None
-        loop = LoopControl()
-        if node.variable is not None:
-            name = self.general_assign(value=loop, var_ast=node.variable, var_type=None)
+    def _assign_for_from_to(self, node, current):
+        self.general_assign(value=current, var_ast=node.assign, var_type=None)
 
+    def _iterate_for_in(self, node):
         expression = self.visit(node.expression)
-        n_variables = len(node.assigns)
-        first_var = node.assigns[0]
-
         if node.take is not None:
             expression = take_splitter(
                 expression=expression,
                 count=self.visit(node.take),
-                values_to_unpack=n_variables
+                values_to_unpack=len(node.assigns)
             )
 
-        for current in expression:
-            loop._count()
-            if loop.get_remaining_ignore_count():
-                loop._ignore()
-                loop._count_finished()
-                continue
-
-            if n_variables == 1:
-                self.general_assign(value=current, var_ast=first_var, var_type=None)
-
-            elif n_variables >= 2:
-                n = 0
-                for current_value, current_variable in zip(current, node.assigns):
-                    self.general_assign(value=current_value, var_ast=current_variable, var_type=None)
-                    n += 1
-
-                if not n == n_variables:
-                    message = f"too many values to unpack (expected {n_variables}, found {n})"
-                    raise ValueError(message)
-
-            result = self.visit(node.block)
-            if isinstance(result, ScriptAction):
-                if result.action == "continue":
-                    if result.data is None or result.data == loop or self.visit(result.data) == loop:
-                        continue
-                    else:
-                        loop._finish()
-                        return result
-
-                elif result.action == "break":
-                    if result.data is None or result.data == loop or self.visit(result.data) == name:
-                        loop._finish()
-                        return None
-                    else:
-                        loop._finish()
-                        return result
-
-                elif result.action == "return":
-                    loop._finish()
-                    return result
-
-            loop._count_finished()
-
-        loop._finish()
+        yield from expression
 
-        if node.else_statement is not None:
-            self.visit(node.else_statement)
+    def _assign_for_in(self, node, current):
+        n_variables = len(node.assigns)
+        if n_variables == 1:
+            self.general_assign(value=current, var_ast=node.assigns[0], var_type=None)
 
-    def visit_SwitchCaseItem(self, node: SwitchCaseItem):
-        """ Execute a switch-case control. """
-        if not isinstance(node, SwitchCaseItem):
-            return None
+        elif n_variables >= 2:
+            n = 0
+            for current_value, current_variable in zip(current, node.assigns):
+                self.general_assign(value=current_value, var_ast=current_variable, var_type=None)
+                n += 1
 
-        for expression in node.cases:
-            if node.compare_expression == self.visit(expression):
-                return self.visit(node.block)
+            if not n == n_variables:
+                message = f"too many values to unpack (expected {n_variables}, found {n})"
+                raise ValueError(message)
 
     def visit_SwitchCaseStatement(self, node: SwitchCaseStatement):
-        """ Execute a switch-case statement. """
-
-        compare_expression = self.visit(node.compare_expression)
-        for expression in node.cases:
-            expression.compare_expression = compare_expression
-            result = self.visit(expression)
-            if isinstance(result, ScriptAction):
-                if result.action == "continue":
+        """ Execute a switch-case statement (the blocks of all the matching cases, until a break). """
+        for block in self._switch_blocks(node):
+            try:
+                self.visit(block)
+
+            except ContinueSignal as action:
+                # Only a 'continue' without label goes to the next case, a labelled one is for its loop.
+                if action.data is None:
                     continue
 
-                elif result.action == "break":
-                    if result.data is None:
-                        return None
+                raise
 
-                return result
+            except BreakSignal as action:
+                if action.data is None:
+                    return None
+
+                raise
 
         if node.default_block is not None:
             return self.visit(node.default_block)
 
-    def visit_WhenCaseItem(self, node: WhenCaseItem):
-        """ Execute a when-case-item control. """
-
-        if not isinstance(node, WhenCaseItem):
-            return None
+    def _switch_blocks(self, node):
+        """ Blocks of the switch items that match the value, in order. """
+        compare_expression = self.visit(node.compare_expression)
+        if node.table is not None and compare_expression.__class__ in CASE_TABLE_TYPES:
+            cases = node.cases
+            return [cases[index].block for index in node.table.get(compare_expression, ())]
 
-        for expression in node.cases:
-            if node.compare_expression == self.visit(expression):
-                return (True, self.visit(node.block))
+        return (item.block for item in node.cases if self._case_matches(item, compare_expression))
 
     def visit_WhenCaseStatement(self, node: WhenCaseStatement):
-        """ Execute a when-case statement. """
+        """ Execute a when-case statement (the expression of the first matching case). """
+        block = self._when_block(node)
+        if block is not None:
+            return self.visit(block)
 
+    def _when_block(self, node):
+        """ Block of the first when item that matches the value, else the default block (or None). """
         compare_expression = self.visit(node.compare_expression)
-        for expression in node.cases:
-            expression.compare_expression = compare_expression
-            result = self.visit(expression)
-            if result is None:
-                continue
+        if node.table is not None and compare_expression.__class__ in CASE_TABLE_TYPES:
+            index = node.table.get(compare_expression)
+            if index is not None:
+                return node.cases[index].block
 
-            if result[0]:
-                return result[1]
+        else:
+            for item in node.cases:
+                if self._case_matches(item, compare_expression):
+                    return item.block
 
-        if node.default_block is not None:
-            return self.visit(node.default_block)
+        return node.default_block
+
+    def _is_loop_target(self, action, loop, name):
+        """ True if a 'break'/'continue' (without label, or with the loop or its name) is for this loop. """
+        return action.data is None or action.data is loop or (name is not None and action.data == name)
+
+    def _case_matches(self, item, compare_expression):
+        """ Evaluate the cases of a switch/when item (in order) until one is equal to the value. """
+        for expression in item.cases:
+            if compare_expression == self.visit(expression):
+                return True
+
+        return False
 
     def visit_WithStatement(self, node: WithStatement):
         """ Execute a with statement. """
         expression = self.visit(node.expression)
 
+        signal = None
         with expression as value:
             if not node.variable is None:
                 self.general_assign(value=value, var_ast=node.variable, var_type=None)
 
-            return self.visit(node.block)
+            try:
+                return self.visit(node.block)
+
+            except ControlFlow as action:
+                # 'return', 'break' and 'continue' leave the block normally: exit without an error.
+                signal = action
+
+        if signal is not None:
+            raise signal
 
     def visit_TryStatement(self, node: TryStatement):
         """ Execute a try-except-finally-else statement. """
 
         error = False
+        depth = len(self.call_stack)
         try:
             return self.visit(node.try_block)
 
+        except ControlFlow:
+            raise
+
         except BaseException as exception:
             error = True
+            self.call_stack.cut(depth)
             for exc in node.except_blocks:
                 class_ = self.visit(exc.expression)
                 if isinstance(exception, class_):
@@ -1434,12 +1407,11 @@ class Interpreter(NodeVisitor):
                     return self.visit(node.else_statement)
 
     def visit_ImportStatement(self, node: ImportStatement):
-        """ Execute a try-except-finally-else statement. """
-        package = ""
+        """ Import KandyScript modules (.ks) or python modules (lazily, unless 'import!'). """
         if node.is_python_file:
+            package = None
             if node.package is not None:
-                for module in node.package:
-                    package = f"{package}.{module.value}"
+                package = ".".join(module.value for module in node.package)
 
             for module in node.module_names:
                 name = module[0].value
@@ -1448,25 +1420,14 @@ class Interpreter(NodeVisitor):
                 else:
                     import_as = name
 
-            module_class = importlib.import_module(name=name, package=package)
-            ar = self.get_module_AR()
-            ar[import_as] = RecordConstant(module_class)
+                module_class = python_import(name, package, lazy=not node.eager)
+                ar = self.get_module_AR()
+                ar[import_as] = RecordConstant(module_class)
 
         else:
-            if node.package is not None:
-                for module in node.package:
-                    package = os.path.join(package, module.value)
-
-            for module in node.module_names:
-                name = module[0].value
-                if module[1] is not None:
-                    import_as = module[1].value
-                else:
-                    import_as = name
-
-                ks_file = os.path.join(package, name) + ".ks"
+            for name, import_as, ks_file in _ks_import_names(node):
                 filename = _search_import_module(ks_file, self.filename)
-                module_class = self._module(filename, name)
+                module_class = self._module(filename, name, lazy=self.lazy_imports and not node.eager)
                 ar = self.get_module_AR()
                 ar[import_as] = RecordConstant(module_class)
 
@@ -1477,11 +1438,11 @@ class Interpreter(NodeVisitor):
         if isinstance(value, (Spaces, ClassObjectWithARC)):
             ar = self.get_ar_from_object(value)
             self.call_stack.push(ar)
-            result = self.visit(node.block)
-            self.call_stack.pop()
+            try:
+                self.visit(node.block)
 
-            if isinstance(result, ScriptAction):
-                return result
+            finally:
+                self.call_stack.pop()
 
         else:
             message = ("Invalid Space, you only can use SpaceClass (like: modules and exported spaces;"
@@ -1535,6 +1496,212 @@ class Interpreter(NodeVisitor):
         expression = self.visit(node.expression)
         pass
 
+    # Generators:
+    # Statements that can contain 'yield' are visited with these python generators:
+    # they yield the values of the script and return the same result that the visit_ method.
+    def generate(self, node):
+        """ Visit a node inside a generator function. """
+        generator = getattr(self, "generate_"+type(node).__name__, None)
+        if generator is None:
+            return self.visit(node)
+
+        return (yield from generator(node))
+
+    def generate_Compound(self, node: Compound):
+        """ Generator version of visit_Compound. """
+        if node.return_action:
+            for child in node.children:
+                yield from self.generate(child)
+
+            return None
+
+        try:
+            for child in node.children:
+                yield from self.generate(child)
+
+        except ReturnSignal as action:
+            return action.data
+
+    def generate_ScriptAction(self, node: ScriptAction):
+        """ Yield the value of a 'yield' statement. """
+        if node.token.type == TokenType.YIELD:
+            value = None
+            if isinstance(node.expression, AST):
+                value = self.visit(node.expression)
+
+            yield value
+            return None
+
+        return self.visit_ScriptAction(node)
+
+    def generate_IfStatement(self, node: IfStatement):
+        """ Generator version of visit_IfStatement. """
+        for condition, statement in node.expressions:
+            if self.visit(condition):
+                return (yield from self.generate(statement))
+
+        if node.else_statement is not None:
+            return (yield from self.generate(node.else_statement))
+
+    def generate_UnlessStatement(self, node: UnlessStatement):
+        """ Generator version of visit_UnlessStatement. """
+        for condition, statement in node.expressions:
+            if not self.visit(condition):
+                return (yield from self.generate(statement))
+
+        if node.else_statement is not None:
+            return (yield from self.generate(node.else_statement))
+
+    def generate_WhileStatement(self, node: WhileStatement):
+        """ Generator version of visit_WhileStatement. """
+        return (yield from self._generate_loop(node, self._iterate_while(node)))
+
+    def generate_UntilStatement(self, node: UntilStatement):
+        """ Generator version of visit_UntilStatement. """
+        return (yield from self._generate_loop(node, self._iterate_while(node)))
+
+    def generate_RepeatStatement(self, node: RepeatStatement):
+        """ Generator version of visit_RepeatStatement. """
+        return (yield from self._generate_loop(node, self._iterate_repeat(node)))
+
+    def generate_ForCStatement(self, node: ForCStatement):
+        """ Generator version of visit_ForCStatement. """
+        return (yield from self._generate_loop(node, self._iterate_for_c(node)))
+
+    def generate_ForFromToStatement(self, node: ForFromToStatement):
+        """ Generator version of visit_ForFromToStatement. """
+        return (yield from self._generate_loop(node, self._iterate_for_from_to(node), self._assign_for_from_to))
+
+    def generate_ForInStatement(self, node: ForInStatement):
+        """ Generator version of visit_ForInStatement. """
+        return (yield from self._generate_loop(node, self._iterate_for_in(node), self._assign_for_in))
+
+    def _generate_loop(self, node, iterations, assign=None):
+        """ Generator version of _visit_loop. """
+        loop, name = self._start_loop(node)
+        for value in iterations:
+            if self._skip_iteration(loop):
+                continue
+
+            if assign is not None:
+                assign(node, value)
+
+            try:
+                yield from self.generate(node.block)
+
+            except ControlFlow as action:
+                if self._loop_signal(action, loop, name):
+                    continue
+
+                return None
+
+            loop._count_finished()
+
+        loop._finish()
+
+        if node.else_statement is not None:
+            yield from self.generate(node.else_statement)
+
+    def generate_SwitchCaseStatement(self, node: SwitchCaseStatement):
+        """ Generator version of visit_SwitchCaseStatement. """
+        for block in self._switch_blocks(node):
+            try:
+                yield from self.generate(block)
+
+            except ContinueSignal as action:
+                # Only a 'continue' without label goes to the next case, a labelled one is for its loop.
+                if action.data is None:
+                    continue
+
+                raise
+
+            except BreakSignal as action:
+                if action.data is None:
+                    return None
+
+                raise
+
+        if node.default_block is not None:
+            return (yield from self.generate(node.default_block))
+
+    def generate_WhenCaseStatement(self, node: WhenCaseStatement):
+        """ Generator version of visit_WhenCaseStatement. """
+        block = self._when_block(node)
+        if block is not None:
+            return (yield from self.generate(block))
+
+    def generate_WithStatement(self, node: WithStatement):
+        """ Generator version of visit_WithStatement. """
+        expression = self.visit(node.expression)
+
+        signal = None
+        with expression as value:
+            if not node.variable is None:
+                self.general_assign(value=value, var_ast=node.variable, var_type=None)
+
+            try:
+                return (yield from self.generate(node.block))
+
+            except ControlFlow as action:
+                # 'return', 'break' and 'continue' leave the block normally: exit without an error.
+                signal = action
+
+        if signal is not None:
+            raise signal
+
+    def generate_TryStatement(self, node: TryStatement):
+        """ Generator version of visit_TryStatement. """
+        error = False
+        try:
+            return (yield from self.generate(node.try_block))
+
+        except GeneratorExit:
+            error = True
+            raise
+
+        except ControlFlow:
+            raise
+
+        except BaseException as exception:
+            error = True
+            for exc in node.except_blocks:
+                class_ = self.visit(exc.expression)
+                if isinstance(exception, class_):
+                    if exc.variable is not None:
+                        self.general_assign(
+                            value=exception,
+                            var_ast=exc.variable,
+                            var_type=None
+                        )
+
+                    return (yield from self.generate(exc.block))
+
+            raise exception
+
+        finally:
+            if node.finally_block is not None:
+                yield from self.generate(node.finally_block)
+
+            if not error:
+                if node.else_statement is not None:
+                    return (yield from self.generate(node.else_statement))
+
+    def generate_UsingStatement(self, node: UsingStatement):
+        """ Generator version of visit_UsingStatement. """
+        value = self.visit(node.variable)
+
+        if isinstance(value, (Spaces, ClassObjectWithARC)):
+            ar = self.get_ar_from_object(value)
+            self.call_stack.push(ar)
+            try:
+                yield from self.generate(node.block)
+
+            finally:
+                self.call_stack.pop()
+
+        else:
+            return self.visit_UsingStatement(node)
+
     # Start the Interpreter:
     def _interpret(self, text):
         tree = self._generate_ast(text)
@@ -1560,55 +1727,283 @@ class Interpreter(NodeVisitor):
         return tree
 
     def _visit_ast(self, tree):
+        limits = self.limits
+        if limits is not None:
+            limits.start()
+
+        run = None
+        if self.profiler is not None or self.tracer is not None:
+            # The code of the shared modules is observed by the run that executes it.
+            run = RunHooks(self._run_wrappers)
+            run.start()
+
+        depth = len(self.call_stack)
         try:
             result = self.visit(tree)
 
-        except BaseException:
+        except BaseException as error:
+            # Unwind the records of the calls interrupted by the error.
+            self.call_stack.cut(depth)
             print("InterpreterError!")
+            if isinstance(error, ControlFlow):
+                # A 'break' or 'continue' outside the loops ('return' ends the program block).
+                self._invalid_script_action()
+
             raise
 
+        finally:
+            self._release_baton()
+            if run is not None:
+                run.stop()
+
+            if limits is not None:
+                limits.stop()
+
         return result
 
+    def _run_wrappers(self, interpreter):
+        """ Wrappers of the profiler and the tracer of this interpreter for a shared interpreter (see RunHooks). """
+        profiler, tracer = self.profiler, self.tracer
+
+        def add_tree(tree):
+            if profiler is not None:
+                profiler.add_tree(tree, interpreter.filename)
+
+            if tracer is not None:
+                tracer.add_tree(tree)
+
+        def tree_wrapper(visit_ast):
+            def visit_ast_with_tree(tree):
+                add_tree(tree)
+                return visit_ast(tree)
+
+            return visit_ast_with_tree
+
+        if interpreter.ast is not None:
+            add_tree(interpreter.ast)
+
+        wrappers = [("_visit_ast", tree_wrapper)]
+        for observer in (profiler, tracer):
+            if observer is not None:
+                wrappers.extend(observer.wrappers(interpreter))
+
+        return wrappers
+
     def _test(self, tree, times=5, user_variables=None, start_variables=None):
         results = []
         for i in range(times):
             self.reset(user_variables=user_variables, start_variables=start_variables)
-            start = time.time()
+            start = time.perf_counter()
             output = self.visit(tree)
-            end = time.time()
+            end = time.perf_counter()
             results.append((output, end-start))
 
         return results
 
-    def _module(self, filename, name):
+    def _module(self, filename, name, lazy=False):
         if os.path.abspath(filename) == os.path.abspath(self.filename):
             return RecordConstant(SpaceClass(self, self.get_global_AR(), "RecursionImportedModule"))
 
-        if filename in self.modules_imported:
-            return self.modules_imported[filename]
+        if os.path.abspath(filename) in self.modules_imported:
+            return self.modules_imported[os.path.abspath(filename)]
+
+        return module_registry.load(self, filename, name, lazy)
 
-        return ModuleClass(self, filename, name)
+    def reload_module(self, module):
+        """ Execute again an imported module (if its file changed, or not) and refresh the module cache. """
+        if not isinstance(module, ModuleClass):
+            raise TypeError(f"reload() argument must be a module, not {type(module).__name__!r}")
+
+        return module_registry.reload(self, module)
 
     def interpret(self, text, reset=True, *, filename=None, user_variables=None, start_variables=None):
         """ Interpret a text or file with KandyScript """
         self.filename = "<VirtualFile>"
 
+        tree = None
         if filename is not None:
             self.filename = os.path.abspath(filename)
-            with open(filename, "rb") as f:
-                text = f.read()
-                text = text.decode("utf-8")
+            tree = module_registry.get_tree(self.filename)
+            if tree is None:
+                text = _read_source(filename)
 
         if reset:
             self.reset(user_variables=user_variables, start_variables=start_variables)
 
-        result = self._interpret(text)
+        if tree is None:
+            tree = self._generate_ast(text)
+        else:
+            self.ast = tree
+
+        if self.preload_imports:
+            self.preload_modules(tree)
+
+        if self.profiler is not None:
+            self.profiler.add_tree(tree, self.filename)
+
+        if self.tracer is not None:
+            self.tracer.add_tree(tree)
+
+        if self.sampling_interval is not None and not (self.sampler is not None and self.sampler.running):
+            self.sampler = SamplingProfiler(self.sampling_interval).start()
+            try:
+                result = self._visit_ast(tree)
+
+            finally:
+                self.sampler.stop()
+
+        else:
+            result = self._visit_ast(tree)
 
         if self.print_call_stack:
             print(self.call_stack)
 
         return result
 
+    def enable_profiler(self, profiler=None):
+        """
+        Profile the visited nodes (functions, lines and node types) until disable_profiler().
+        The profiled visit wraps the method of this instance only, so disabled costs nothing.
+        The code of the shared modules is profiled while a run of this interpreter executes it.
+        """
+        if profiler is None:
+            profiler = Profiler()
+
+        if self.profiler is not None:
+            self.hooks.remove(self.profiler)
+
+        self.profiler = profiler
+        for name, wrapper in profiler.wrappers(self):
+            self.hooks.add(profiler, self, name, wrapper)
+        if self.ast is not None:
+            profiler.add_tree(self.ast, self.filename)
+
+        return profiler
+
+    def disable_profiler(self):
+        """ Stop profiling and return the profiler with the results. """
+        profiler = self.profiler
+        self.profiler = None
+        if profiler is not None:
+            self.hooks.remove(profiler)
+
+        return profiler
+
+    def subscribe(self, sink, tracer=None):
+        """
+        Send the execution events (function enter/exit, loops, imports, exceptions) to a sink:
+        a callable of the event dict, like RingBufferSink or JsonLinesSink. See Tracer.
+        The traced methods wrap the ones of this instance only while there are subscribers.
+        """
+        if self.tracer is None:
+            (tracer if tracer is not None else Tracer()).attach(self)
+
+        return self.tracer.subscribe(sink)
+
+    def unsubscribe(self, sink):
+        """ Stop sending the events to a sink; without subscribers, the tracer is detached (modules too). """
+        tracer = self.tracer
+        tracer.unsubscribe(sink)
+        if not tracer.sinks:
+            tracer.detach()
+
+    def set_limits(self, max_steps=None, timeout=None, max_memory=None, *, token=None, limits=None):
+        """
+        Limit each run of this interpreter (and of the module code it runs): raise
+        KandyResourceLimitError when a run is over its steps, seconds or bytes, and
+        KandyKeyboardInterrupt when the CancellationToken is cancelled. See ResourceLimits.
+        """
+        if self.limits is not None:
+            self.limits.detach(self)
+
+        if limits is None:
+            limits = ResourceLimits(max_steps, timeout, max_memory, token=token)
+
+        limits.attach(self)
+        return limits
+
+    def cancellable(self, token=None):
+        """ Make the runs cancellable (keeping the current limits) and return the CancellationToken. """
+        if token is None:
+            token = CancellationToken()
+
+        if self.limits is None:
+            self.set_limits(token=token)
+        else:
+            self.limits.token = token
+
+        return token
+
+    def remove_limits(self):
+        """ Stop limiting the runs and return the limits. """
+        limits = self.limits
+        if limits is not None:
+            limits.detach(self)
+
+        return limits
+
+    def preload_modules(self, tree, processes=False, max_workers=None):
+        """
+        Read and parse in parallel the .ks modules imported by the tree (and by those modules).
+
+        The modules are still executed by their import statements (in dependency order), with the
+        parsed trees. Parsing is pure Python: use processes=True to parse on several cores.
+        Return the number of modules preloaded.
+        """
+        executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        seen = set()
+        pending = set()
+        with executor_class(max_workers=max_workers) as executor:
+            def submit_imports(tree, current_filename):
+                for filename in _imported_files(tree, current_filename):
+                    if filename in seen or module_registry.get(filename) is not None:
+                        continue
+
+                    seen.add(filename)
+                    if module_registry.get_tree(filename) is None:
+                        pending.add(executor.submit(_parse_module, filename))
+
+            submit_imports(tree, self.filename)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    if result is not None:
+                        filename, stamp, module_tree = result
+                        module_registry.add_tree(filename, stamp, module_tree)
+                        submit_imports(module_tree, filename)
+
+        return len(seen)
+
+    async def interpret_async(self, text, reset=True, *, filename=None, user_variables=None, start_variables=None):
+        """ Interpret on the running asyncio event loop: 'await' lets the loop overlap the I/O. """
+        loop = asyncio.get_running_loop()
+        interpret = functools.partial(
+            self.interpret,
+            text,
+            reset,
+            filename=filename,
+            user_variables=user_variables,
+            start_variables=start_variables
+        )
+
+        self.event_loop = loop
+        try:
+            return await loop.run_in_executor(None, interpret)
+
+        finally:
+            self.event_loop = None
+
+    def interpret_archive(self, path, reset=True, *, user_variables=None, start_variables=None):
+        """ Interpret the main script of an archive (see bundle), loading its modules from it. """
+        archive = open_archive(path)
+        return self.interpret_from_filename(
+            archive.filename(ARCHIVE_MAIN),
+            reset=reset,
+            user_variables=user_variables,
+            start_variables=start_variables
+        )
+
     def interpret_from_filename(self, filename, reset=True, *, user_variables=None, start_variables=None):
         """ Alias to Interpret.interpret(filename=FILE)"""
         return self.interpret(
@@ -1624,9 +2019,7 @@ class Interpreter(NodeVisitor):
 
         if filename is not None:
             self.filename = os.path.abspath(filename)
-            with open(filename, "rb") as f:
-                text = f.read()
-                text = text.decode("utf-8")
+            text = _read_source(filename)
 
         tree = self._generate_ast(text)
         return self._test(tree, times, user_variables=user_variables, start_variables=start_variables)
@@ -1666,28 +2059,132 @@ class Interpreter(NodeVisitor):
         print("\n\n")
 
 
+def _read_source(filename):
+    """ Read a KandyScript file; big files are decoded from a memory map (no bytes copy in memory). """
+    with open(filename, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < KANDY_MMAP_SOURCE_SIZE:
+            return f.read().decode("utf-8")
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return str(mapped, "utf-8")
+
+
+async def _as_coroutine(awaitable):
+    return await awaitable
+
+
 def _search_import_module(name, current_filename=""):
     if not name.lower().endswith(".ks"):
         name = f"{name}.ks"
 
-    if os.path.exists(current_filename):
+    if current_filename and not current_filename.startswith("<"):
         dirname = os.path.dirname(os.path.abspath(current_filename))
 
     else:
         dirname = os.path.abspath(".")
 
-    file_test = os.path.join(dirname, name)
-    if os.path.exists(file_test):
-        return file_test
+    parts = [part for part in name.replace("\\", "/").split("/") if part]
 
-    file_test = os.path.join(KANDY_LIBRARY_DIRECTORY, name)
-    if os.path.exists(file_test):
-        return file_test
+    # Modules imported from an archive are searched in the archive first.
+    archive = find_archive(dirname + os.sep)
+    if archive is not None:
+        filename = archive.find(parts, archive.member(dirname))
+        if filename is not None:
+            return filename
 
-    message = "Impossible to load KandyModule."
+        dirname = os.path.dirname(archive.path)
+    filename = module_index.find(parts, [dirname, *KANDY_PATH])
+    if filename is not None:
+        return filename
+
+    message = f"Impossible to load KandyModule: {name!r}."
     raise ModuleNotFoundError(message)
 
 
+def _ks_import_names(node):
+    """ Yield (name, import_as, ks_file) of each module of a .ks import statement. """
+    package = ""
+    if node.package is not None:
+        for module in node.package:
+            package = os.path.join(package, module.value)
+
+    for module in node.module_names:
+        name = module[0].value
+        if module[1] is not None:
+            import_as = module[1].value
+        else:
+            import_as = name
+
+        yield name, import_as, os.path.join(package, name) + ".ks"
+
+
+def _imported_files(tree, current_filename):
+    """ Yield the filenames of the .ks modules imported anywhere in a tree. """
+    nodes = [tree]
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, ImportStatement):
+            if node.is_python_file:
+                continue
+
+            for _, _, ks_file in _ks_import_names(node):
+                try:
+                    yield _search_import_module(ks_file, current_filename)
+
+                except ModuleNotFoundError:
+                    pass  # Reported (or caught by the script) when the statement is executed.
+
+        elif isinstance(node, AST):
+            nodes.extend(vars(node).values())
+
+        elif isinstance(node, (list, tuple)):
+            nodes.extend(node)
+
+
+def _parse_module(filename):
+    """ Return (filename, stamp, tree) of a module, or None if it can't be parsed now. """
+    try:
+        stamp = module_registry.stamp(filename)
+        return filename, stamp, Parser().parse(_read_source(filename))
+
+    except Exception:
+        return None  # The error is reported with its context when the module is imported.
+
+
+def bundle(filename, output):
+    """
+    Pack a script and every .ks module it imports (transitively), parsed, into an archive.
+    Return the number of modules packed with the script.
+    """
+    filename = os.path.abspath(filename)
+    root = os.path.dirname(filename)
+    members = {filename: ARCHIVE_MAIN}
+    trees = {}
+    pending = [filename]
+    while pending:
+        current = pending.pop()
+        tree = Parser().parse(_read_source(current))
+        trees[members[current]] = tree
+        for imported in _imported_files(tree, current):
+            if imported not in members:
+                members[imported] = _archive_member(imported, root)
+                pending.append(imported)
+
+    write_archive(output, trees)
+    return len(trees) - 1
+
+
+def _archive_member(filename, root):
+    """ Member name of a module: relative to the main script, or to its search path directory. """
+    for base, prefix in ((root, ""), *((path, ARCHIVE_LIBRARY) for path in KANDY_PATH)):
+        relative = os.path.relpath(filename, os.path.abspath(base))
+        if not relative.startswith(os.pardir):
+            return "/".join([part for part in (prefix, *relative.split(os.sep)) if part])
+
+    raise ValueError(f"The module {filename!r} is not inside the script directory or the KANDYPATH.")
+
+
 def parse(text):
     """ Fast use of Interpreter-class """
     lexer = Lexer()
@@ -1704,6 +2201,37 @@ if __name__ == "__main__":
     if len(sys.argv) == 1:
         resultado = inter.interpret_from_filename(".\\kandydemo\\luca_prueba.ks", 15)
         #resultado = inter.console_mode()
+    elif sys.argv[1] == "--bundle":
+        # python main.py --bundle script.ks script.ksa
+        count = bundle(sys.argv[2], sys.argv[3])
+        print(f"Bundled {sys.argv[2]} and {count} modules into {sys.argv[3]}")
+        resultado = None
+    elif sys.argv[1] == "--profile":
+        # python main.py --profile script.ks [stats.prof]
+        profiler = inter.enable_profiler()
+        resultado = inter.interpret_from_filename(sys.argv[2])
+        print("\n" + profiler.report())
+        if len(sys.argv) > 3:
+            profiler.dump_stats(sys.argv[3])
+    elif sys.argv[1] == "--sample":
+        # python main.py --sample script.ks [stacks.folded]
+        inter.sampling_interval = 0.005
+        resultado = inter.interpret_from_filename(sys.argv[2])
+        print("\n" + inter.sampler.report())
+        if len(sys.argv) > 3:
+            inter.sampler.dump_collapsed(sys.argv[3])
+    elif sys.argv[1] == "--trace":
+        # python main.py --trace script.ks [events.jsonl]
+        sink = JsonLinesSink(sys.argv[3] if len(sys.argv) > 3 else sys.stderr)
+        inter.subscribe(sink)
+        try:
+            resultado = inter.interpret_from_filename(sys.argv[2])
+        finally:
+            inter.unsubscribe(sink)
+            sink.close()
+    elif sys.argv[1].lower().endswith(".ksa"):
+        print("\nRunning KandyScript: \n")
+        resultado = inter.interpret_archive(sys.argv[1])
     else:
         print("\nRunning KandyScript: \n")
         resultado = inter.interpret_from_filename(sys.argv[1])
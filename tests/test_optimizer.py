@@ -0,0 +1,50 @@
+""" Tests of the common-subexpression pass (kandylib.optimizer). """
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kandylib.parser import Parser  # noqa: E402
+from kandylib.ast import AST, Assign, BinOp, Call, Attribute, SubexpressionScope  # noqa: E402
+
+
+def assignment(code):
+    """ Return the first assignment of a parsed program. """
+    nodes = [Parser().parse(code)]
+    while nodes:
+        node = nodes.pop(0)
+        if isinstance(node, Assign):
+            return node
+
+        if isinstance(node, AST):
+            nodes.extend(vars(node).values())
+
+        elif isinstance(node, (list, tuple)):
+            nodes.extend(node)
+
+    raise AssertionError(f"No assignment in {code!r}.")
+
+
+class CommonSubexpressionTest(unittest.TestCase):
+    def test_call_argument_on_the_right(self):
+        right = assignment("x = g() + f(c.a.b + c.a.b)").right
+        self.assertIsInstance(right, BinOp)
+        self.assertIsInstance(right.right, Call)
+        self.assertIsInstance(right.right.params[0], SubexpressionScope)
+
+    def test_call_argument_on_the_left(self):
+        # The left operand of a BinOp is an expression, not an assignment target.
+        right = assignment("x = f(c.a.b + c.a.b) + g()").right
+        self.assertIsInstance(right, BinOp)
+        self.assertIsInstance(right.left, Call)
+        self.assertIsInstance(right.left.params[0], SubexpressionScope)
+
+    def test_assignment_target_is_kept(self):
+        node = assignment("c.a.b = c.a.b + c.a.b")
+        self.assertIsInstance(node.left, Attribute)
+        self.assertIsInstance(node.right, SubexpressionScope)
+
+
+if __name__ == "__main__":
+    unittest.main()